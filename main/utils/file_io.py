@@ -0,0 +1,61 @@
+"""File readers and writers shared by the processing scripts."""
+
+import mmap
+import os
+from typing import Any, Union
+
+import orjson
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+# Indent JSON output for debugging
+PRETTY_JSON = os.getenv("PROCESS_JSON_PRETTY", "").lower() in ("1", "true", "yes")
+
+
+def read_text(path: PathLike) -> str:
+    """Read a UTF-8 text file, decoding straight from a memory map unless it fits in one page."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < mmap.PAGESIZE:
+            text = f.read().decode("utf-8")
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                text = str(mm, "utf-8")
+
+    # Match the newline translation of a text-mode read
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def read_json(path: PathLike) -> Any:
+    """Decode a JSON file, parsing straight from a memory map unless it fits in one page."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < mmap.PAGESIZE:
+            return orjson.loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                return orjson.loads(view)
+            finally:
+                view.release()
+
+
+def dump_json(data: Any, indent: bool = False) -> bytes:
+    """Encode data as UTF-8 JSON bytes, compact unless indent is set."""
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+    return orjson.dumps(data, option=option)
+
+
+def write_json(path: PathLike, data: Any, indent: bool = PRETTY_JSON) -> None:
+    """Atomically write data to path as UTF-8 JSON, compact unless indent is set.
+
+    The data goes to a temporary file that then replaces path, so readers never
+    see a partial file and a hardlink at path is replaced rather than written through.
+    """
+    payload = dump_json(data, indent=indent)
+    tmp_path = f"{os.fspath(path)}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
@@ -1,24 +1,95 @@
+import asyncio
 import base64
+import io
+import json
 import logging
 import os
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from django.conf import settings
-from groq import Groq
+from groq import AsyncGroq, Groq
+from PIL import Image
 
 logger = logging.getLogger("main.utils.image_groq")
 
+# Bump whenever the prompt or model changes so cached analyses are not reused
+PROMPT_VERSION = "1"
+
+# Transport-level retries; the Groq SDK retries 408/409/429/5xx and connection
+# errors with exponential backoff, honoring Retry-After headers
+GROQ_CLIENT_RETRIES = 5
+
+# Images are downscaled to fit this box before upload; larger scans only add payload
+GROQ_IMAGE_MAX_SIZE = (1024, 1024)
+GROQ_JPEG_QUALITY = 85  # JPEG quality (1-100) for downscaled images
+
+ANALYSIS_PROMPT = (
+    "You are an expert at analyzing plumbing code diagrams and images. "
+    "Please describe what you see in this image, focusing on plumbing-related details. "
+    "Be specific about pipe configurations, fixtures, and measurements if visible."
+)
+BATCH_PROMPT = (
+    "You are an expert at analyzing plumbing code diagrams and images. "
+    "Describe each of the following {count} images, focusing on plumbing-related details. "
+    "Be specific about pipe configurations, fixtures, and measurements if visible. "
+    "Respond with only a JSON array of {count} strings, one description per image, in order."
+)
+
 
 class GroqImageProcessor:
     """Processor class for analyzing images using Groq AI API."""
 
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the processor with optional API key."""
+    def __init__(self, api_key: Optional[str] = None, max_retries: int = GROQ_CLIENT_RETRIES):
+        """Initialize the processor with optional API key and retry count."""
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
-        self.client = Groq(api_key=self.api_key)
+        # Both clients keep pooled keep-alive connections; create one processor and reuse it
+        self.client = Groq(api_key=self.api_key, max_retries=max_retries)
+        self.async_client = AsyncGroq(api_key=self.api_key, max_retries=max_retries)
+
+    @staticmethod
+    def _encode_image(image_path: str) -> str:
+        """Read and base64-encode an image, downscaling it if it is too large."""
+        with Image.open(image_path) as img:
+            if img.width > GROQ_IMAGE_MAX_SIZE[0] or img.height > GROQ_IMAGE_MAX_SIZE[1]:
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                img.thumbnail(GROQ_IMAGE_MAX_SIZE, Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                img.save(buffer, "JPEG", quality=GROQ_JPEG_QUALITY, optimize=True)
+                return base64.b64encode(buffer.getvalue()).decode()
+
+        # Small enough already: send the original bytes untouched
+        with open(image_path, "rb") as image_file:
+            return base64.b64encode(image_file.read()).decode()
+
+    def _completion_request(self, image_path: str) -> Dict[str, Any]:
+        """Build the chat completion arguments for analyzing an image."""
+        image_data = self._encode_image(image_path)
+
+        return {
+            "model": "mixtral-8x7b-32768",
+            "messages": [{"role": "user", "content": f"{ANALYSIS_PROMPT}\n\nImage: {image_data}"}],
+            "temperature": 0.7,
+            "max_tokens": 500,
+        }
+
+    def _batch_completion_request(self, image_paths: List[str]) -> Dict[str, Any]:
+        """Build the chat completion arguments for analyzing several images at once."""
+        images = "\n\n".join(
+            f"Image {number}: {self._encode_image(image_path)}"
+            for number, image_path in enumerate(image_paths, 1)
+        )
+        prompt = BATCH_PROMPT.format(count=len(image_paths))
+
+        return {
+            "model": "mixtral-8x7b-32768",
+            "messages": [{"role": "user", "content": f"{prompt}\n\n{images}"}],
+            "temperature": 0.7,
+            "max_tokens": 500 * len(image_paths),
+        }
 
     def analyze_image(self, image_path: str) -> str:
         """
@@ -31,32 +102,73 @@ class GroqImageProcessor:
             String containing the AI's description of the image
         """
         try:
-            # Read and encode image
-            with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode()
-
-            # Create prompt with image
-            prompt = (
-                "You are an expert at analyzing plumbing code diagrams and images. "
-                "Please describe what you see in this image, focusing on plumbing-related details. "
-                "Be specific about pipe configurations, fixtures, and measurements if visible."
-            )
-
             # Send request to Groq
             completion = self.client.chat.completions.create(
-                model="mixtral-8x7b-32768",
-                messages=[{"role": "user", "content": f"{prompt}\n\nImage: {image_data}"}],
-                temperature=0.7,
-                max_tokens=500,
+                **self._completion_request(image_path)
             )
 
             # Return the generated description
             return completion.choices[0].message.content
 
         except Exception as e:
-            logger.error(f"Error analyzing image {image_path}: {str(e)}")
+            logger.error("Error analyzing image %s: %s", image_path, e)
             return ""
 
+    async def analyze_image_async(self, image_path: str) -> str:
+        """
+        Analyze an image using the async Groq client and return the description.
+
+        Unlike analyze_image, errors are raised so callers can retry them.
+
+        Args:
+            image_path: Path to the image file to analyze
+
+        Returns:
+            String containing the AI's description of the image
+        """
+        # Image decoding and resizing is CPU-bound, so keep it off the event loop
+        request = await asyncio.to_thread(self._completion_request, image_path)
+        completion = await self.async_client.chat.completions.create(**request)
+        return completion.choices[0].message.content
+
+    async def analyze_images_async(self, image_paths: List[str]) -> List[str]:
+        """
+        Analyze several images in a single Groq request.
+
+        Falls back to one request per image when the reply is not a JSON array
+        with one description per image. Errors are raised as in analyze_image_async.
+
+        Args:
+            image_paths: Paths to the image files to analyze
+
+        Returns:
+            List of descriptions in the same order as image_paths
+        """
+        if len(image_paths) == 1:
+            return [await self.analyze_image_async(image_paths[0])]
+
+        request = await asyncio.to_thread(self._batch_completion_request, image_paths)
+        completion = await self.async_client.chat.completions.create(**request)
+        content = completion.choices[0].message.content or ""
+        try:
+            analyses = json.loads(content)
+        except ValueError:
+            analyses = None
+
+        if (
+            isinstance(analyses, list)
+            and len(analyses) == len(image_paths)
+            and all(isinstance(analysis, str) for analysis in analyses)
+        ):
+            return analyses
+
+        logger.warning(
+            "Unexpected batch reply for %d images, analyzing them one at a time", len(image_paths)
+        )
+        return list(
+            await asyncio.gather(*(self.analyze_image_async(path) for path in image_paths))
+        )
+
 
 if __name__ == "__main__":
     # Use the image path provided
@@ -1,11 +1,17 @@
 """Module for processing text files into JSON format."""
 
-import json
 import logging
 import os
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import AbstractSet, Any, Dict, Iterator, List, Optional, Tuple
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+from main.utils.file_io import read_text, write_json  # noqa: E402
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,28 +21,62 @@ logger = logging.getLogger(__name__)
 TEXT_FILE_EXT = ".txt"
 TABLE_FILE_EXT = "_data.csv"
 ANALYTICS_FILE_EXT = ".png"
+FILE_WORKERS = 16  # Concurrent file reads in process_directory
+
+# Filename patterns, compiled once: NYCP2ch_1pg.txt -> chapter 2, page 1
+_PAGE_RE = re.compile(r"ch_(\d+)pg")
+_CHAPTER_RE = re.compile(r"NYCP(\d+)ch_\d+pg")
+
+
+def list_names(directory: str) -> AbstractSet[str]:
+    """Return the entry names in directory, or an empty set if it is missing."""
+    try:
+        with os.scandir(directory) as entries:
+            return frozenset(entry.name for entry in entries)
+    except FileNotFoundError:
+        return frozenset()
+
+
+def _sidecar_path(
+    file_path: str, subdir: str, ext: str, names: Optional[AbstractSet[str]]
+) -> Optional[str]:
+    """Path to file_path's sidecar in ../subdir if it exists.
+
+    names, when given, is a listing of that directory and replaces the stat.
+    """
+    path = Path(file_path)
+    filename = f"{path.stem}{ext}"
+    if names is not None and filename not in names:
+        return None
+    sidecar_path = str(path.parent.parent / subdir / filename)
+    return sidecar_path if names is not None or os.path.exists(sidecar_path) else None
 
 
-def get_table_data(file_path: str) -> Optional[str]:
+def get_table_data(file_path: str, table_names: Optional[AbstractSet[str]] = None) -> Optional[str]:
     """Get the path to the table data file if it exists."""
-    base_path = str(Path(file_path).parent.parent / "tables" / Path(file_path).stem)
-    table_path = f"{base_path}{TABLE_FILE_EXT}"
-    return table_path if os.path.exists(table_path) else None
+    return _sidecar_path(file_path, "tables", TABLE_FILE_EXT, table_names)
 
 
-def get_analytics_image(file_path: str) -> Optional[str]:
+def get_analytics_image(
+    file_path: str, analytics_names: Optional[AbstractSet[str]] = None
+) -> Optional[str]:
     """Get the path to the analytics image if it exists."""
-    base_path = str(Path(file_path).parent.parent / "analytics" / Path(file_path).stem)
-    analytics_path = f"{base_path}{ANALYTICS_FILE_EXT}"
-    return analytics_path if os.path.exists(analytics_path) else None
+    return _sidecar_path(file_path, "analytics", ANALYTICS_FILE_EXT, analytics_names)
 
 
-def process_file(file_path: str, original_path: str) -> Dict[str, Any]:
+def process_file(
+    file_path: str,
+    original_path: str,
+    table_names: Optional[AbstractSet[str]] = None,
+    analytics_names: Optional[AbstractSet[str]] = None,
+) -> Dict[str, Any]:
     """Process a single text file and extract data.
 
     Args:
         file_path: Path to text file to process.
         original_path: Path to original image file.
+        table_names: Listing of the tables directory; stat each sidecar if omitted.
+        analytics_names: Listing of the analytics directory; stat each sidecar if omitted.
 
     Returns:
         Dictionary containing processed file data.
@@ -49,16 +89,15 @@ def process_file(file_path: str, original_path: str) -> Dict[str, Any]:
         raise FileNotFoundError(f"File not found: {file_path}")
 
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            raw_text = file.read()
+        raw_text = read_text(file_path)
 
         # Get page number from filename
-        match = re.search(r"ch_(\d+)pg", file_path)
+        match = _PAGE_RE.search(file_path)
         page_num = int(match.group(1)) if match else 0
 
         # Get table data and analytics image if they exist
-        table_path = get_table_data(file_path)
-        analytics_path = get_analytics_image(file_path)
+        table_path = get_table_data(file_path, table_names)
+        analytics_path = get_analytics_image(file_path, analytics_names)
 
         # Create file data structure
         file_data = {
@@ -87,34 +126,40 @@ def get_chapter_from_filename(filename: str) -> tuple:
 
     Example: NYCP2ch_1pg.txt -> (2, "NYCPC", "")
     """
-    match = re.match(r"NYCP(\d+)ch_\d+pg", filename)
+    match = _CHAPTER_RE.match(filename)
     if match:
         chapter = match.group(1)
         return chapter, "NYCPC", ""
     return "", "", ""
 
 
-def process_directory(text_dir: str, original_dir: str) -> Dict[str, Dict[str, Any]]:
-    """Process all text files in a directory.
+def iter_chapters(text_dir: str, original_dir: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Process the text files in a directory one chapter at a time.
+
+    Only one chapter's file data is held in memory at a time.
 
     Args:
         text_dir: Path to directory containing text files.
         original_dir: Path to directory containing original images.
 
-    Returns:
-        Dictionary of chapter data.
+    Yields:
+        (chapter key, chapter data) pairs, in order of each chapter's first file.
     """
     if not os.path.isdir(text_dir):
         raise NotADirectoryError(f"Directory not found: {text_dir}")
 
-    chapter_files = {}
-
-    # Process all text files
-    for filename in sorted(os.listdir(text_dir)):
-        if not filename.endswith(TEXT_FILE_EXT):
-            continue
-
-        file_path = os.path.join(text_dir, filename)
+    # Collect all text files, bucketed by chapter in sorted filename order
+    chapter_jobs: Dict[str, List[tuple]] = {}
+    chapter_meta: Dict[str, Dict[str, str]] = {}
+    with os.scandir(text_dir) as entries:
+        text_entries = sorted(
+            (entry for entry in entries if entry.name.endswith(TEXT_FILE_EXT)),
+            key=lambda entry: entry.name,
+        )
+
+    for entry in text_entries:
+        filename = entry.name
+        file_path = entry.path
         chapter, code_type, code_title = get_chapter_from_filename(filename)
 
         if not chapter:
@@ -124,25 +169,48 @@ def process_directory(text_dir: str, original_dir: str) -> Dict[str, Dict[str, A
         # Get corresponding original image path
         original_filename = f"{filename[:-4]}.jpg"  # Replace .txt with .jpg
         original_path = os.path.join(original_dir, original_filename)
+        chapter_key = f"{code_type}{chapter}CH_"
+        if chapter_key not in chapter_jobs:
+            chapter_jobs[chapter_key] = []
+            chapter_meta[chapter_key] = {"c": chapter, "t": code_type, "ct": code_title}
+        chapter_jobs[chapter_key].append((filename, file_path, original_path))
+
+    # List the sidecar directories once instead of stat-ing two paths per file
+    sidecar_root = Path(text_dir).parent
+    table_names = list_names(str(sidecar_root / "tables"))
+    analytics_names = list_names(str(sidecar_root / "analytics"))
+
+    # Read each chapter's files concurrently; results are kept in sorted order
+    with ThreadPoolExecutor(max_workers=FILE_WORKERS) as executor:
+        for chapter_key, jobs in chapter_jobs.items():
+            futures = [
+                executor.submit(process_file, path, original, table_names, analytics_names)
+                for _, path, original in jobs
+            ]
+
+            files = []
+            for (filename, _, _), future in zip(jobs, futures):
+                try:
+                    files.append(future.result())
+                except Exception as e:
+                    logger.error(f"Error processing {filename}: {str(e)}")
+                    continue
+
+            if files:
+                yield chapter_key, {"m": chapter_meta[chapter_key], "f": files}
 
-        # Process the file
-        try:
-            file_data = process_file(file_path, original_path)
-
-            # Create or update chapter data
-            chapter_key = f"{code_type}{chapter}CH_"
-            if chapter_key not in chapter_files:
-                chapter_files[chapter_key] = {
-                    "m": {"c": chapter, "t": code_type, "ct": code_title},
-                    "f": [],
-                }
-            chapter_files[chapter_key]["f"].append(file_data)
-
-        except Exception as e:
-            logger.error(f"Error processing {filename}: {str(e)}")
-            continue
 
-    return chapter_files
+def process_directory(text_dir: str, original_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Process all text files in a directory.
+
+    Args:
+        text_dir: Path to directory containing text files.
+        original_dir: Path to directory containing original images.
+
+    Returns:
+        Dictionary of chapter data.
+    """
+    return dict(iter_chapters(text_dir, original_dir))
 
 
 def save_json(data: Dict[str, Dict[str, Any]], output_dir: str) -> None:
@@ -158,14 +226,22 @@ def save_json(data: Dict[str, Dict[str, Any]], output_dir: str) -> None:
     os.makedirs(output_dir, exist_ok=True)
 
     for chapter_key, chapter_data in data.items():
-        output_file = os.path.join(output_dir, f"{chapter_key}.json")
-        try:
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(chapter_data, f, indent=2, ensure_ascii=False)
-            logger.info(f"Successfully saved JSON to: {output_file}")
-        except OSError as e:
-            logger.error(f"Failed to save JSON to {output_file}: {str(e)}")
-            raise
+        save_chapter(chapter_key, chapter_data, output_dir)
+
+
+def save_chapter(chapter_key: str, chapter_data: Dict[str, Any], output_dir: str) -> None:
+    """Save one chapter's data to <output_dir>/<chapter_key>.json.
+
+    Raises:
+        OSError: If the output file cannot be written.
+    """
+    output_file = os.path.join(output_dir, f"{chapter_key}.json")
+    try:
+        write_json(output_file, chapter_data)
+        logger.info(f"Successfully saved JSON to: {output_file}")
+    except OSError as e:
+        logger.error(f"Failed to save JSON to {output_file}: {str(e)}")
+        raise
 
 
 def main() -> None:
@@ -177,12 +253,14 @@ def main() -> None:
         original_dir = base_path / "optimizer"
         output_dir = base_path / "json"
 
-        # Process files and save by chapter
-        data = process_directory(str(text_dir), str(original_dir))
-        save_json(data, str(output_dir))
+        # Process files and save each chapter as soon as it is complete
+        os.makedirs(output_dir, exist_ok=True)
+        total_files = 0
+        for chapter_key, chapter_data in iter_chapters(str(text_dir), str(original_dir)):
+            save_chapter(chapter_key, chapter_data, str(output_dir))
+            total_files += len(chapter_data["f"])
 
         # Log processing summary
-        total_files = sum(len(chapter["f"]) for chapter in data.values())
         logger.info(f"Processed {total_files} files. Results saved to {output_dir}")
 
     except Exception as e:
@@ -22,12 +22,22 @@ PLUMBING_CODE_DIRS = {
     "analytics": PLUMBING_CODE_DIR / "analytics",
 }
 
+# Directory strings joined into per-table paths
+_TABLES_DIR = str(PLUMBING_CODE_DIRS["tables"])
+_ANALYTICS_DIR = str(PLUMBING_CODE_DIRS["analytics"])
+
+# Compiled patterns
+_CHAPTER_FILE_RE = re.compile(r"NYCP(\d+)CH")
+_SECTION_ID_RE = re.compile(r"^(\d+\.\d+(?:\.\d+)?)")  # e.g. "312.5" in "312.5 Water supply"
+_SECTION_HEADER_RE = re.compile(r"SECTION PC \d+\n[A-Z\s]+\n+")
+_OCR_PATH_RE = re.compile(r"NYCP(\d+)ch_(\d+)pg\.txt$")
+_SECTION_LINE_RE = re.compile(r"^(\d+\.\d+(?:\.\d+)?)\s+(.+)$")
+
 
 def extract_chapter_info(filename: str, raw_text: str) -> tuple[str, str]:
     """Extract chapter number from filename and title from raw text."""
     # Look for chapter number in filename
-    filename_pattern = r"NYCP(\d+)CH"
-    match = re.search(filename_pattern, filename)
+    match = _CHAPTER_FILE_RE.search(filename)
     if not match:
         return None, None
 
@@ -43,11 +53,15 @@ def extract_chapter_info(filename: str, raw_text: str) -> tuple[str, str]:
     return chapter_num, None
 
 
+def _section_key(section: Dict[str, Any]) -> tuple:
+    """Sort key for a section ID such as "312.5"."""
+    return tuple(float(p) for p in section["i"].split("."))
+
+
 def process_section(section_text: str, content: str) -> Dict[str, str]:
     """Process a section into id and text."""
     # Extract section ID (e.g., "312.5" from "312.5 Water supply system test")
-    id_pattern = r"^(\d+\.\d+(?:\.\d+)?)"
-    match = re.search(id_pattern, section_text)
+    match = _SECTION_ID_RE.search(section_text)
     if match:
         section_id = match.group(1)
         # Get the title (everything after the ID)
@@ -61,7 +75,7 @@ def process_section(section_text: str, content: str) -> Dict[str, str]:
             full_text += "\n" + content
 
         # Remove any "SECTION PC XXX" headers from the text
-        full_text = re.sub(r"SECTION PC \d+\n[A-Z\s]+\n+", "", full_text)
+        full_text = _SECTION_HEADER_RE.sub("", full_text)
 
         return {"i": section_id, "t": full_text.strip()}  # id  # text
     else:
@@ -72,8 +86,7 @@ def process_section(section_text: str, content: str) -> Dict[str, str]:
 def get_ocr_path(file_path: str, base_path: str) -> str:
     """Generate corresponding OCR image path from text file path."""
     # Extract chapter and page info from file path
-    path_pattern = r"NYCP(\d+)ch_(\d+)pg\.txt$"
-    match = re.search(path_pattern, file_path)
+    match = _OCR_PATH_RE.search(file_path)
     if match:
         chapter_num = match.group(1)
         page_num = match.group(2)
@@ -143,46 +156,46 @@ def process_json_data(input_file: str, output_file: str) -> None:
                     "f": file_entry["i"],  # Reference to source file
                 }
                 if file_entry.get("tb_data"):
-                    table_entry["d"] = str(
-                        PLUMBING_CODE_DIRS["tables"] / Path(file_entry["tb_data"]).name
+                    table_entry["d"] = os.path.join(
+                        _TABLES_DIR, os.path.basename(file_entry["tb_data"])
                     )
                 if file_entry.get("tb_img"):
-                    table_entry["img"] = str(
-                        PLUMBING_CODE_DIRS["analytics"] / Path(file_entry["tb_img"]).name
+                    table_entry["img"] = os.path.join(
+                        _ANALYTICS_DIR, os.path.basename(file_entry["tb_img"])
                     )
                 optimized_data["tb"].append(table_entry)
 
             # Process sections from text content
             sections = []
             current_section = None
-            for line in text_content.split("\n"):
-                line = line.strip()
-                if not line:
+            content_lines = []  # Joined once per section instead of repeated str +=
+            for raw_line in text_content.split("\n"):
+                if not (line := raw_line.strip()):
                     continue
 
-                # Check for section header (e.g., "308.5 Interval of support")
-                section_match = re.match(r"^(\d+\.\d+(?:\.\d+)?)\s+(.+)$", line)
+                # Check for section header (e.g., "308.5 Interval of support"); most
+                # lines start with a letter and cannot match, so skip the regex for them
+                section_match = _SECTION_LINE_RE.match(line) if line[0].isdigit() else None
                 if section_match:
                     if current_section:
+                        current_section["c"] = "".join(content_lines)
                         sections.append(current_section)
                     section_id = section_match.group(1)
                     section_title = section_match.group(2)
                     current_section = {"i": section_id, "t": line, "c": "", "f": file_entry["i"]}
+                    content_lines = []
                 elif current_section:
-                    current_section["c"] += line + "\n"
+                    content_lines.append(line + "\n")
 
             if current_section:
+                current_section["c"] = "".join(content_lines)
                 sections.append(current_section)
 
             # Add processed sections
             optimized_data["s"].extend(sections)
 
         # Sort sections by ID numerically
-        def section_key(section):
-            parts = section["i"].split(".")
-            return tuple(float(p) for p in parts)
-
-        optimized_data["s"].sort(key=section_key)
+        optimized_data["s"].sort(key=_section_key)
 
         # Create output directory if it doesn't exist
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -1,14 +1,22 @@
 """Script to upload processed JSON and image files to AWS."""
 
-import json
 import logging
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, List
 
 import boto3
 import django
+import orjson
+from botocore.awsrequest import (
+    AWSHTTPConnection,
+    AWSHTTPConnectionPool,
+    AWSHTTPSConnection,
+    AWSHTTPSConnectionPool,
+)
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from django.conf import settings
 from dotenv import load_dotenv
@@ -17,6 +25,29 @@ from dotenv import load_dotenv
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("main.utils.process_aws")
 
+# Send block size for botocore's connections (8 KiB under urllib3 1.26, 16 KiB under
+# 2.x) so large uploads are not CPU-bound on small socket writes
+HTTP_BLOCKSIZE = 1024 * 1024
+
+
+def _with_blocksize(connection_cls):
+    """Subclass a botocore connection class to default to HTTP_BLOCKSIZE."""
+
+    class LargeBlockConnection(connection_cls):
+        def __init__(self, *args, **kwargs):
+            # urllib3 2.x's pool manager always passes its own blocksize, so override
+            # it; both 1.26 and 2.x hand it on to http.client
+            kwargs["blocksize"] = HTTP_BLOCKSIZE
+            super().__init__(*args, **kwargs)
+
+    LargeBlockConnection.__name__ = connection_cls.__name__
+    return LargeBlockConnection
+
+
+# Only botocore's pools are changed; other http.client users keep the stdlib default
+AWSHTTPConnectionPool.ConnectionCls = _with_blocksize(AWSHTTPConnection)
+AWSHTTPSConnectionPool.ConnectionCls = _with_blocksize(AWSHTTPSConnection)
+
 # Add the project root to the Python path
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
@@ -54,6 +85,9 @@ logger.info("Secret Key length: %s", len(AWS_SECRET_ACCESS_KEY))
 logger.info("Region: %s", AWS_REGION)
 logger.info("Bucket: %s", AWS_BUCKET_NAME)
 
+# Number of concurrent image uploads
+UPLOAD_WORKERS = 8
+
 
 def get_aws_client():
     """Get AWS S3 client."""
@@ -63,6 +97,7 @@ def get_aws_client():
             aws_access_key_id=AWS_ACCESS_KEY_ID,
             aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
             region_name=AWS_REGION,
+            config=Config(tcp_keepalive=True),
         )
         logger.info("Using AWS credentials from Django settings")
         return s3_client
@@ -71,13 +106,35 @@ def get_aws_client():
         raise
 
 
-def upload_file(file_path: str, bucket: str, object_name: str = None) -> bool:
+def _needs_upload(s3_client, bucket: str, object_name: str, file_path: str) -> bool:
+    """Check whether the local file differs from the stored S3 object.
+
+    Compares the local size and mtime against the object's ContentLength and the
+    mtime metadata recorded at upload time. Missing objects always need uploading,
+    as do objects we cannot inspect: without s3:ListBucket, S3 answers HeadObject
+    on a missing key with 403 rather than 404.
+    """
+    try:
+        head = s3_client.head_object(Bucket=bucket, Key=object_name)
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code")
+        if code in ("404", "NoSuchKey", "NotFound", "403", "Forbidden", "AccessDenied"):
+            return True
+        raise
+
+    stat = os.stat(file_path)
+    remote_mtime = head.get("Metadata", {}).get("mtime")
+    return head.get("ContentLength") != stat.st_size or remote_mtime != str(stat.st_mtime)
+
+
+def upload_file(file_path: str, bucket: str, object_name: str = None, s3_client=None) -> bool:
     """Upload a file to an S3 bucket.
 
     Args:
         file_path: Path to file to upload
         bucket: Bucket to upload to
         object_name: S3 object name (if different from local file name)
+        s3_client: Client to upload with (a new one is created if not given)
 
     Returns:
         True if file was uploaded, else False
@@ -86,10 +143,20 @@ def upload_file(file_path: str, bucket: str, object_name: str = None) -> bool:
     if object_name is None:
         object_name = os.path.basename(file_path)
 
-    s3_client = get_aws_client()
+    if s3_client is None:
+        s3_client = get_aws_client()
 
     try:
-        s3_client.upload_file(file_path, bucket, object_name)
+        if not _needs_upload(s3_client, bucket, object_name, file_path):
+            logger.info("Skipping unchanged %s (%s/%s)", file_path, bucket, object_name)
+            return True
+
+        s3_client.upload_file(
+            file_path,
+            bucket,
+            object_name,
+            ExtraArgs={"Metadata": {"mtime": str(os.path.getmtime(file_path))}},
+        )
         logger.info("Successfully uploaded %s to %s/%s", file_path, bucket, object_name)
         return True
     except ClientError as e:
@@ -107,8 +174,8 @@ def process_json_file(json_path: Path) -> List[str]:
         List of image paths referenced in the JSON
     """
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(json_path, "rb") as f:
+            data = orjson.loads(f.read())
 
         # Extract image paths from 'o' field in 'f' entries
         image_paths = []
@@ -124,25 +191,44 @@ def process_json_file(json_path: Path) -> List[str]:
         return []
 
 
-def upload_files():
+def upload_files(s3_client=None):
     """Upload JSON and image files to AWS S3."""
     try:
-        # Process each *_groq.json file
-        for json_file in PLUMBING_CODE_DIRS["json_final"].glob("*_groq.json"):
-            logger.info("Processing %s", json_file)
-
-            # Upload JSON file
-            json_s3_path = "json/%s" % json_file.name
-            if not upload_file(str(json_file), AWS_BUCKET_NAME, json_s3_path):
-                raise Exception("Failed to upload JSON file: %s" % json_file)
-
-            # Get referenced image paths and upload them
-            image_paths = process_json_file(json_file)
-            for img_path in image_paths:
-                # Create S3 path maintaining directory structure
-                img_s3_path = "images/%s" % os.path.basename(img_path)
-                if not upload_file(img_path, AWS_BUCKET_NAME, img_s3_path):
-                    logger.warning("Failed to upload image: %s", img_path)
+        # One client for every upload: clients are thread-safe and share a connection
+        # pool, whereas creating them from the default session on threads is not
+        if s3_client is None:
+            s3_client = get_aws_client()
+
+        # Image uploads (and their HeadObject checks) overlap on a thread pool
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            image_uploads = {}
+            uploaded_keys = set()  # Images shared between chapters are uploaded once
+
+            # Process each *_groq.json file
+            for json_file in PLUMBING_CODE_DIRS["json_final"].glob("*_groq.json"):
+                logger.info("Processing %s", json_file)
+
+                # Upload JSON file
+                json_s3_path = "json/%s" % json_file.name
+                if not upload_file(str(json_file), AWS_BUCKET_NAME, json_s3_path, s3_client):
+                    raise Exception("Failed to upload JSON file: %s" % json_file)
+
+                # Get referenced image paths and upload them
+                image_paths = process_json_file(json_file)
+                for img_path in image_paths:
+                    # Create S3 path maintaining directory structure
+                    img_s3_path = "images/" + img_path.rsplit("/", 1)[-1]
+                    if img_s3_path in uploaded_keys:
+                        continue
+                    uploaded_keys.add(img_s3_path)
+                    future = executor.submit(
+                        upload_file, img_path, AWS_BUCKET_NAME, img_s3_path, s3_client
+                    )
+                    image_uploads[future] = img_path
+
+            for future in as_completed(image_uploads):
+                if not future.result():
+                    logger.warning("Failed to upload image: %s", image_uploads[future])
 
         logger.info("Successfully completed file upload process")
 
@@ -187,7 +273,7 @@ def main():
             raise
 
         # Upload files
-        upload_files()
+        upload_files(s3_client)
         logger.info("Successfully completed AWS upload process")
 
     except Exception as e:
@@ -1,13 +1,15 @@
 """Script for creating embeddings from plumbing code JSON files with best practices."""
 
 import asyncio
-import json
 import logging
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 
 import numpy as np
+import orjson
 from embed_open import DocumentEmbedder
 from tqdm import tqdm
 
@@ -19,6 +21,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Runs of whitespace (including newlines) collapse to a single space
+_WS_RE = re.compile(r"\s+")
+
+SIMILARITY_BLOCK_ROWS = 1024  # int8 rows widened at a time when scoring a query
+
+
+def _quantize_int8(vectors: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize embedding rows to int8 with a per-row scale factor."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scale = np.max(np.abs(vectors), axis=1, keepdims=True) / 127
+    scale[scale == 0] = 1.0
+    quantized = np.round(vectors / scale).astype(np.int8)
+    return quantized, scale.astype(np.float16)
+
+
+def _int8_row_norms(doc_vectors: np.ndarray) -> np.ndarray:
+    """Compute the L2 norm of each int8 row, widening one block of rows at a time."""
+    norms = np.empty(len(doc_vectors))
+    for start in range(0, len(doc_vectors), SIMILARITY_BLOCK_ROWS):
+        block = doc_vectors[start : start + SIMILARITY_BLOCK_ROWS].astype(np.float64)
+        norms[start : start + len(block)] = np.sqrt(np.einsum("ij,ij->i", block, block))
+    return norms
+
+
+def _int8_similarity(
+    doc_vectors: np.ndarray, query_vector: np.ndarray, doc_norms: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Compute cosine similarity between int8 document rows and an int8 query.
+
+    Per-row scales cancel out of the cosine so only the integer vectors and norms
+    are needed. Rows are widened to float64 (exact for int8 dot products) one block
+    at a time, so the matrix is never copied whole. Pass doc_norms from
+    _int8_row_norms to avoid recomputing them on every query.
+    """
+    if doc_norms is None:
+        doc_norms = _int8_row_norms(doc_vectors)
+    query = query_vector.astype(np.float64)
+    dots = np.empty(len(doc_vectors))
+    for start in range(0, len(doc_vectors), SIMILARITY_BLOCK_ROWS):
+        block = doc_vectors[start : start + SIMILARITY_BLOCK_ROWS]
+        dots[start : start + len(block)] = block.astype(np.float64) @ query
+    denom = doc_norms * np.linalg.norm(query)
+    denom[denom == 0] = 1.0
+    return dots / denom
+
+
+def _chunk_key(chunk: Dict[str, Any]) -> Tuple[str, str]:
+    """Identify a chunk by its entry id and text, which fix its embedding."""
+    return f"{chunk['source_file']}-{chunk['section']}", chunk["text"]
+
 
 class PlumbingCodeEmbedder:
     """Class for creating and managing embeddings for plumbing code documents."""
@@ -29,14 +81,19 @@ class PlumbingCodeEmbedder:
         self.chunk_size = 1500  # Target words per chunk
         self.batch_size = 20
         self.delay = 0.1
+        self.concurrency = 8  # Embedding batches in flight at once
+        self._search_index: Optional[Dict[str, Any]] = None  # Last embeddings file loaded
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Drop the API client and search index when pickled for worker processes."""
+        state = self.__dict__.copy()
+        state["embedder"] = None
+        state["_search_index"] = None
+        return state
 
     def _clean_text(self, text: str) -> str:
         """Clean and normalize text content."""
-        # Remove excessive whitespace
-        text = " ".join(text.split())
-        # Normalize newlines
-        text = text.replace("\n\n", "\n")
-        return text
+        return _WS_RE.sub(" ", text).strip()
 
     def _create_chunks(self, text: str, section_id: str, title: str) -> List[Dict[str, Any]]:
         """Create meaningful chunks from text while preserving context."""
@@ -60,14 +117,18 @@ class PlumbingCodeEmbedder:
     def process_json_file(self, file_path: str) -> List[Dict[str, Any]]:
         """Process a single JSON file and prepare chunks for embedding."""
         try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
+            with open(file_path, "rb") as f:
+                data = orjson.loads(f.read())
 
             chunks = []
             chapter_info = data.get("m", {})
             chapter_num = chapter_info.get("c", "")
             chapter_title = chapter_info.get("ct", "")
 
+            # Shared by every chunk of this file
+            source_file = os.path.basename(file_path)
+            ocr_paths = [f["o"] for f in data.get("f", [])]
+
             # Process sections
             for section in data.get("s", []):
                 section_id = section.get("i", "")
@@ -84,8 +145,8 @@ class PlumbingCodeEmbedder:
                                 "section": section_id,
                                 "title": chapter_title,
                                 "text": chunk["text"],
-                                "source_file": os.path.basename(file_path),
-                                "ocr_paths": [f["o"] for f in data.get("f", [])],
+                                "source_file": source_file,
+                                "ocr_paths": ocr_paths,
                             }
                         )
 
@@ -100,107 +161,245 @@ class PlumbingCodeEmbedder:
         try:
             # Get all JSON files
             json_files = [f for f in os.listdir(input_dir) if f.endswith(".json")]
+            file_paths = [os.path.join(input_dir, file_name) for file_name in json_files]
             all_chunks = []
 
-            # Process each file
-            for file_name in tqdm(json_files, desc="Processing JSON files"):
-                file_path = os.path.join(input_dir, file_name)
-                chunks = self.process_json_file(file_path)
-                all_chunks.extend(chunks)
-
-            # Create embeddings in batches
-            embeddings = []
-            for i in tqdm(range(0, len(all_chunks), self.batch_size), desc="Creating embeddings"):
-                batch = all_chunks[i : i + self.batch_size]
-                batch_texts = [chunk["text"] for chunk in batch]
-
-                try:
-                    batch_embeddings = self.embedder.get_embeddings_batch(
-                        batch_texts, batch_size=self.batch_size, delay=self.delay
-                    )
-
-                    for chunk, embedding in zip(batch, batch_embeddings):
-                        embeddings.append(
-                            {
-                                "id": f"{chunk['source_file']}-{chunk['section']}",
-                                "text": chunk["text"],
-                                "embedding": embedding,
-                                "metadata": {
-                                    "chapter": chunk["chapter"],
-                                    "section": chunk["section"],
-                                    "title": chunk["title"],
-                                    "source_file": chunk["source_file"],
-                                    "ocr_paths": chunk["ocr_paths"],
-                                },
-                            }
-                        )
-
-                    # Save progress periodically
-                    if len(embeddings) % 100 == 0:
-                        self._save_embeddings(embeddings, output_file)
-
-                except Exception as e:
-                    logger.error(f"Error in batch starting at index {i}: {str(e)}")
-                    # Save progress before raising error
-                    self._save_embeddings(embeddings, output_file)
-                    raise
+            # Parsing and chunking is CPU-bound, so fan it out across processes
+            with ProcessPoolExecutor() as executor:
+                results = executor.map(self.process_json_file, file_paths, chunksize=4)
+                for chunks in tqdm(results, total=len(file_paths), desc="Processing JSON files"):
+                    all_chunks.extend(chunks)
+
+            # Create embeddings in batches, appending each batch to a JSONL progress
+            # file so a failed run keeps its work without rewriting it every time.
+            # Chunks already recorded there by an earlier run are not embedded again.
+            progress_file = output_file + ".jsonl"
+            recorded = self._load_progress(progress_file)
+            pending = [chunk for chunk in all_chunks if _chunk_key(chunk) not in recorded]
+            if recorded:
+                logger.info(
+                    f"Resuming from {progress_file}: "
+                    f"{len(all_chunks) - len(pending)} chunks already embedded"
+                )
+            with open(progress_file, "ab") as progress:
+                for entry in await self._embed_chunks(pending, progress, progress_file):
+                    recorded[(entry["id"], entry["text"])] = entry
+            embeddings = [recorded[_chunk_key(chunk)] for chunk in all_chunks]
 
             # Save final results
             self._save_embeddings(embeddings, output_file)
+            os.remove(progress_file)
             logger.info(f"Successfully created embeddings for {len(embeddings)} chunks")
 
         except Exception as e:
             logger.error(f"Error in create_embeddings: {str(e)}")
             raise
 
+    def _build_entries(
+        self, batch: List[Dict[str, Any]], batch_embeddings: List[List[float]]
+    ) -> List[Dict[str, Any]]:
+        """Pair a batch of chunks with their embeddings."""
+        return [
+            {
+                "id": _chunk_key(chunk)[0],
+                "text": chunk["text"],
+                "embedding": embedding,
+                "metadata": {
+                    "chapter": chunk["chapter"],
+                    "section": chunk["section"],
+                    "title": chunk["title"],
+                    "source_file": chunk["source_file"],
+                    "ocr_paths": chunk["ocr_paths"],
+                },
+            }
+            for chunk, embedding in zip(batch, batch_embeddings)
+        ]
+
+    async def _embed_chunks(
+        self, all_chunks: List[Dict[str, Any]], progress: BinaryIO, progress_file: str
+    ) -> List[Dict[str, Any]]:
+        """Embed chunks with several batches in flight at once.
+
+        Worker tasks pull batch offsets from a queue and run the blocking API call in
+        a thread; this coroutine drains their results, appends each batch to the
+        progress file as it arrives and returns all entries in chunk order.
+        """
+        offsets: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+        for i in range(0, len(all_chunks), self.batch_size):
+            offsets.put_nowait(i)
+        num_batches = offsets.qsize()
+
+        async def worker() -> None:
+            while not offsets.empty():
+                i = offsets.get_nowait()
+                batch = all_chunks[i : i + self.batch_size]
+                try:
+                    batch_embeddings = await asyncio.to_thread(
+                        self.embedder.get_embeddings_batch,
+                        [chunk["text"] for chunk in batch],
+                        batch_size=self.batch_size,
+                        delay=self.delay,
+                    )
+                    await results.put((i, self._build_entries(batch, batch_embeddings), None))
+                except Exception as e:
+                    await results.put((i, None, e))
+
+        workers = [
+            asyncio.create_task(worker()) for _ in range(min(self.concurrency, num_batches))
+        ]
+        entries_by_offset = {}
+        try:
+            for _ in tqdm(range(num_batches), desc="Creating embeddings"):
+                i, entries, error = await results.get()
+                if error is not None:
+                    logger.error(f"Error in batch starting at index {i}: {str(error)}")
+                    logger.error(f"Progress so far is saved in {progress_file}")
+                    raise error
+                entries_by_offset[i] = entries
+
+                # Save progress for this batch only
+                self._append_progress(entries, progress)
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        return [entry for i in sorted(entries_by_offset) for entry in entries_by_offset[i]]
+
+    def _quantize_rows(self, embeddings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return copies of embedding entries with int8 vectors and per-row scales."""
+        rows = []
+        if embeddings:
+            quantized, scales = _quantize_int8([e["embedding"] for e in embeddings])
+            for entry, q_row, scale in zip(embeddings, quantized, scales[:, 0]):
+                rows.append({**entry, "embedding": q_row, "scale": float(scale)})
+        return rows
+
+    def _load_progress(self, progress_file: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Load entries recorded by an earlier run, keyed like _chunk_key.
+
+        Vectors are dequantized so they can be saved with the new ones. A partial
+        last line left by an interrupted write is truncated away before appending.
+        """
+        entries = {}
+        try:
+            with open(progress_file, "r+b") as f:
+                valid_size = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        row = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        break
+                    valid_size += len(line)
+                    scale = row.pop("scale")
+                    row["embedding"] = np.asarray(row["embedding"], np.float32) * scale
+                    entries[(row["id"], row["text"])] = row
+                f.truncate(valid_size)
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _append_progress(self, embeddings: List[Dict[str, Any]], progress: BinaryIO):
+        """Append one JSON line per embedding to an open progress file."""
+        for row in self._quantize_rows(embeddings):
+            progress.write(orjson.dumps(row, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
+        progress.flush()
+
     def _save_embeddings(self, embeddings: List[Dict[str, Any]], output_file: str):
-        """Save embeddings with metadata to file."""
+        """Save embeddings with metadata to file.
+
+        Vectors are stored as int8 with a per-row scale, which keeps the file and the
+        in-memory search matrix a quarter of the size of float embeddings.
+        """
+        rows = self._quantize_rows(embeddings)
+
         output_data = {
             "metadata": {
                 "created_at": datetime.now().isoformat(),
                 "model": self.embedder.model,
-                "version": "1.0",
+                "version": "1.1",
+                "quantization": "int8",
                 "num_embeddings": len(embeddings),
             },
-            "embeddings": embeddings,
+            "embeddings": rows,
         }
 
         # Save with temporary file to prevent corruption
         temp_file = output_file + ".tmp"
         try:
-            with open(temp_file, "w") as f:
-                json.dump(output_data, f, indent=2)
+            with open(temp_file, "wb") as f:
+                f.write(orjson.dumps(output_data, option=orjson.OPT_SERIALIZE_NUMPY))
             os.replace(temp_file, output_file)
         except Exception as e:
             if os.path.exists(temp_file):
                 os.remove(temp_file)
             raise
 
+    def _load_search_index(self, embeddings_file: str) -> Dict[str, Any]:
+        """Load an embeddings file for searching, with int8 row norms computed once.
+
+        The result is kept until a search names a different file or the file changes.
+        """
+        stat = os.stat(embeddings_file)
+        file_id = (embeddings_file, stat.st_size, stat.st_mtime_ns)
+        if self._search_index is not None and self._search_index["file_id"] == file_id:
+            return self._search_index
+
+        with open(embeddings_file, "rb") as f:
+            data = orjson.loads(f.read())
+
+        vectors = [e["embedding"] for e in data["embeddings"]]
+        if data.get("metadata", {}).get("quantization") == "int8":
+            doc_vectors = np.array(vectors, np.int8)
+            norms = _int8_row_norms(doc_vectors)
+        else:
+            doc_vectors = np.array(vectors)
+            norms = None
+
+        self._search_index = {
+            "file_id": file_id,
+            "metadata": [e["metadata"] for e in data["embeddings"]],
+            "texts": [e["text"] for e in data["embeddings"]],
+            "vectors": doc_vectors,
+            "norms": norms,
+        }
+        return self._search_index
+
     def search_embeddings(
         self, query: str, embeddings_file: str, top_k: int = 5
     ) -> List[Dict[str, Any]]:
         """Search for most relevant sections given a query."""
         try:
-            # Load embeddings
-            with open(embeddings_file, "r") as f:
-                data = json.load(f)
-
-            embeddings_data = {
-                "embeddings": [np.array(e["embedding"]) for e in data["embeddings"]],
-                "metadata": [e["metadata"] for e in data["embeddings"]],
-                "texts": [e["text"] for e in data["embeddings"]],
-            }
+            # Load embeddings (reused across searches until the file changes)
+            embeddings_data = self._load_search_index(embeddings_file)
 
             # Get query embedding
             query_embedding = self.embedder.get_embedding(query)
 
             # Calculate similarities
-            similarities = self.embedder.compute_similarity(
-                query_embedding, embeddings_data["embeddings"]
-            )
+            doc_vectors = embeddings_data["vectors"]
+            if embeddings_data["norms"] is not None:
+                query_vector, _ = _quantize_int8(query_embedding)
+                similarities = _int8_similarity(
+                    doc_vectors, query_vector[0], embeddings_data["norms"]
+                )
+            else:
+                # Files written before quantization store plain float vectors
+                similarities = np.asarray(
+                    self.embedder.compute_similarity(query_embedding, doc_vectors)
+                )
 
             # Get top results
-            top_indices = np.argsort(similarities)[-top_k:][::-1]
+            # Partition out the top_k candidates, then sort only those
+            top_k = min(top_k, len(similarities))
+            if top_k < len(similarities):
+                candidates = np.argpartition(-similarities, top_k)[:top_k]
+            else:
+                candidates = np.arange(len(similarities))
+            top_indices = candidates[np.argsort(-similarities[candidates])]
 
             results = []
             for idx in top_indices:
@@ -4,11 +4,17 @@ import logging
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import django
 from django.conf import settings
 
+try:
+    import re2 as _regex
+except ImportError:
+    _regex = re
+
 # Add the project root to the Python path
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(BASE_DIR))
@@ -23,25 +29,25 @@ django.setup()
 # Set up logging using Django's configuration
 logger = logging.getLogger("main.utils.process_filename")
 
+# Number of concurrent os.rename calls in rename_files
+RENAME_WORKERS = 16
+
+# Every supported format ("NYCP3ch_4pg", "chapter_2_1page", "5Screenshot3",
+# "8...12") has the chapter and page as its first two digit runs, so one pattern
+# covers them all. When the optional google-re2 bindings are installed it is
+# compiled to an RE2 automaton instead of the stdlib backtracking engine.
+_FILENAME_RE = _regex.compile(r"(\d+).*?(\d+)")  # matches "5Screenshot3" or "8...12"
+
 
 def extract_chapter_page(filename: str) -> tuple:
     """Extract chapter and page numbers from filename."""
     # Remove file extension
     name = os.path.splitext(filename)[0]
 
-    # Try different patterns
-    patterns = [
-        r"(\d+).*?(\d+)",  # matches "5Screenshot3" or "8...12"
-        r"chapter[_]?(\d+)[_]?(\d+)page",  # matches "chapter_2_1page" or "chapter2_1page"
-        r"NYCP(\d+)ch[_](\d+)pg",  # matches existing NYCP format
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, name, re.IGNORECASE)
-        if match:
-            return match.group(1), match.group(2)
-
-    return None, None
+    match = _FILENAME_RE.search(name)
+    if not match:
+        return None, None
+    return match.group(1), match.group(2)
 
 
 def generate_nycp_name(chapter: str, page: str, ext: str) -> str:
@@ -52,52 +58,84 @@ def generate_nycp_name(chapter: str, page: str, ext: str) -> str:
 def rename_files() -> None:
     """Rename files in the uploads directory to NYCP format."""
     uploads_dir = settings.PLUMBING_CODE_PATHS["uploads"]
-    logger.info(f"Starting file renaming in directory: {uploads_dir}")
+    logger.info("Starting file renaming in directory: %s", uploads_dir)
 
     try:
         # Create directory if it doesn't exist
         os.makedirs(uploads_dir, exist_ok=True)
-        logger.info(f"Uploads directory ensured: {uploads_dir}")
-
-        # Get list of files in directory (excluding hidden files)
-        files = [
-            f
-            for f in os.listdir(uploads_dir)
-            if not f.startswith(".") and os.path.isfile(os.path.join(uploads_dir, f))
-        ]
-        logger.info(f"Found {len(files)} files to process")
-
-        for filename in files:
-            try:
-                logger.info(f"Processing file: {filename}")
-                filepath = os.path.join(uploads_dir, filename)
-
-                # Extract chapter and page numbers
-                chapter, page = extract_chapter_page(filename)
-                if not chapter or not page:
-                    logger.warning(f"Could not extract chapter/page from filename: {filename}")
+        logger.info("Uploads directory ensured: %s", uploads_dir)
+
+        # Stream directory entries (excluding hidden files); renames are only queued
+        # here, so the directory is not modified while it is being scanned
+        splitext = os.path.splitext
+        renames = []
+        names = set()
+        with os.scandir(uploads_dir) as it:
+            files = (e for e in it if not e.name.startswith(".") and e.is_file())
+            for entry in files:
+                filename = entry.name
+                names.add(filename)
+                try:
+                    logger.info("Processing file: %s", filename)
+                    filepath = entry.path
+
+                    # Extract chapter and page numbers
+                    chapter, page = extract_chapter_page(filename)
+                    if not chapter or not page:
+                        logger.warning("Could not extract chapter/page from filename: %s", filename)
+                        continue
+
+                    # Generate new filename
+                    ext = splitext(filename)[1]
+                    new_filename = generate_nycp_name(chapter, page, ext)
+                    new_filepath = os.path.join(uploads_dir, new_filename)
+
+                    # Queue the rename
+                    if filename != new_filename:
+                        renames.append((filepath, new_filepath, filename, new_filename))
+                    else:
+                        logger.info("File already in correct format: %s", filename)
+
+                except Exception as e:
+                    logger.error("Error processing file %s: %s", filename, e)
                     continue
 
-                # Generate new filename
-                ext = os.path.splitext(filename)[1]
-                new_filename = generate_nycp_name(chapter, page, ext)
-                new_filepath = os.path.join(uploads_dir, new_filename)
-
-                # Rename file
-                if filename != new_filename:
-                    os.rename(filepath, new_filepath)
-                    logger.info(f"Renamed {filename} to {new_filename}")
-                else:
-                    logger.info(f"File already in correct format: {filename}")
-
-            except Exception as e:
-                logger.error(f"Error processing file {filename}: {e}")
+        # Two uploads can map to the same NYCP name, and os.rename would silently replace
+        # one with the other; the first by filename wins and any target that is
+        # already taken is left alone
+        claimed = set()
+        queued = []
+        for src, dst, filename, new_filename in sorted(renames):
+            if new_filename in claimed or new_filename in names:
+                logger.warning(
+                    "Skipping %s: %s already exists or is claimed by another upload",
+                    filename,
+                    new_filename,
+                )
                 continue
+            claimed.add(new_filename)
+            queued.append((src, dst, filename, new_filename))
+
+        logger.info("Found %s files to process, %s to rename", len(names), len(queued))
+
+        # Renames are metadata round trips, so overlap them on slow filesystems
+        with ThreadPoolExecutor(max_workers=RENAME_WORKERS) as executor:
+            futures = {
+                executor.submit(os.rename, src, dst): (filename, new_filename)
+                for src, dst, filename, new_filename in queued
+            }
+            for future in as_completed(futures):
+                filename, new_filename = futures[future]
+                try:
+                    future.result()
+                    logger.info("Renamed %s to %s", filename, new_filename)
+                except Exception as e:
+                    logger.error("Error processing file %s: %s", filename, e)
 
         logger.info("File renaming completed successfully")
 
     except Exception as e:
-        logger.error(f"Error in rename_files: {e}")
+        logger.error("Error in rename_files: %s", e)
         raise
 
 
@@ -108,7 +146,7 @@ def main():
         rename_files()
         logger.info("File renaming process completed successfully")
     except Exception as e:
-        logger.error(f"Error in main process: {e}")
+        logger.error("Error in main process: %s", e)
         sys.exit(1)
 
 
@@ -1,16 +1,22 @@
 #!/usr/bin/env python3
 """Script to process and import plumbing code data into the database."""
 
-import json
 import logging
 import os
 import shutil
 import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 
+import numpy as np
 from django.core.files import File
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 # Add project root to Python path
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(BASE_DIR))
@@ -24,179 +30,411 @@ django.setup()
 # Import Django settings and models after setup
 from django.conf import settings  # noqa: E402
 from django.contrib.auth.models import User  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
 
 from main.models import PlumbingDocument, PlumbingImage, PlumbingTable  # noqa: E402
+from main.utils.file_io import read_json, read_text  # noqa: E402
 
 # Configure logger
 logger = logging.getLogger("main.utils.process_final_data")
 
+# Below this many files the numba compile cost outweighs the faster scan
+NUMBA_MIN_FILES = 1000
+
+# Settings are fixed once Django is set up, so read them once
+PROJECT_BASE_DIR = settings.BASE_DIR
+
+
+@lru_cache(maxsize=None)
+def plumbing_code_path(name: str) -> str:
+    """Return a PLUMBING_CODE_PATHS entry, looked up in settings only once."""
+    return str(settings.PLUMBING_CODE_PATHS[name])
+
 
 def extract_page_number(filename: str) -> Optional[int]:
     """Extract page number from filenames like NYCP3ch_1pg.jpg or NYCP3ch_4pg.csv"""
+    # Find the part between '_' and 'pg', within the second '_'-separated field
+    _, sep, rest = filename.partition("_")
+    if not sep:
+        return None
+    page_num = rest.partition("_")[0].partition("pg")[0]
     try:
-        # Find the part between '_' and 'pg'
-        parts = filename.split("_")
-        if len(parts) < 2:
-            return None
-        page_num = parts[1].split("pg")[0]
         return int(page_num)
-    except (ValueError, IndexError):
+    except ValueError:
         return None
 
 
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def _page_numbers_kernel(buf: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Parse page numbers from concatenated UTF-8 filenames.
+
+        Returns -1 where a name has no '_' and -2 where the text between '_' and
+        'pg' is not a plain run of ASCII digits, so the caller can defer those
+        names to extract_page_number.
+        """
+        out = np.empty(len(offsets) - 1, np.int64)
+        for i in range(len(offsets) - 1):
+            end = offsets[i + 1]
+            pos = offsets[i]
+            while pos < end and buf[pos] != 95:  # '_'
+                pos += 1
+            if pos == end:
+                out[i] = -1
+                continue
+
+            pos += 1
+            stop = pos
+            while stop < end and not (
+                buf[stop] == 112 and stop + 1 < end and buf[stop + 1] == 103  # 'pg'
+            ):
+                stop += 1
+
+            value = 0
+            valid = pos < stop <= pos + 18
+            for j in range(pos, stop):
+                digit = int(buf[j]) - 48
+                if digit < 0 or digit > 9:
+                    valid = False
+                    break
+                value = value * 10 + digit
+            out[i] = value if valid else -2
+        return out
+
+
+def extract_page_numbers(filenames: List[str]) -> List[Optional[int]]:
+    """Extract page numbers for many filenames at once.
+
+    Large batches are parsed by a numba kernel when numba is installed; anything
+    it cannot parse exactly, and small batches, go through extract_page_number.
+    """
+    if numba is None or len(filenames) < NUMBA_MIN_FILES:
+        return [extract_page_number(name) for name in filenames]
+
+    encoded = [name.encode("utf-8") for name in filenames]
+    offsets = np.zeros(len(encoded) + 1, np.int64)
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    pages: List[Optional[int]] = []
+    for name, page in zip(filenames, _page_numbers_kernel(buf, offsets).tolist()):
+        if page == -1:
+            pages.append(None)
+        elif page == -2:
+            pages.append(extract_page_number(name))
+        else:
+            pages.append(page)
+    return pages
+
+
+def _doc_prefix(doc: PlumbingDocument) -> str:
+    """Return the filename prefix used for a document's images and tables."""
+    return doc.title.split("_")[0].replace("CH", "ch")
+
+
+def _scan_dir(directory: str, suffix: str) -> List[str]:
+    """List the names of regular files in a directory that end with suffix."""
+    with os.scandir(directory) as it:
+        return [entry.name for entry in it if entry.name.endswith(suffix) and entry.is_file()]
+
+
+def _build_prefix_trie(prefixes: Iterable[str]) -> Dict:
+    """Build a character trie; nodes that end a prefix store it under the None key."""
+    trie: Dict = {}
+    for prefix in prefixes:
+        node = trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = prefix
+    return trie
+
+
+def _match_prefix(trie: Dict, name: str) -> Optional[str]:
+    """Return the longest prefix in the trie that name starts with, if any."""
+    node = trie
+    match = node.get(None)
+    for char in name:
+        node = node.get(char)
+        if node is None:
+            break
+        match = node.get(None, match)
+    return match
+
+
+def _index_dir(directory: str, suffix: str, trie: Dict) -> Dict[str, Dict[int, str]]:
+    """Scan a directory once and group its files by document prefix and page number.
+
+    Returns {prefix_lower: {page_number: filename}}, preferring files without
+    random suffixes when a page has several candidates.
+    """
+    matched = []
+    for filename in _scan_dir(directory, suffix):
+        prefix = _match_prefix(trie, filename.lower())
+        if prefix is not None:
+            matched.append((prefix, filename))
+
+    index: Dict[str, Dict[int, str]] = {}
+    page_numbers = extract_page_numbers([filename for _, filename in matched])
+    for (prefix, filename), page_number in zip(matched, page_numbers):
+        if page_number is None:
+            continue
+
+        page_files = index.setdefault(prefix, {})
+        if page_number not in page_files or "_" not in filename:
+            page_files[page_number] = filename
+    return index
+
+
 def process_json_files(user: User, json_dir: str = "media/plumbing_code/json_final") -> None:
     """Process JSON files and create PlumbingDocument records."""
-    json_path = os.path.join(settings.BASE_DIR, json_dir)
-    logger.info(f"Processing JSON files from: {json_path}")
+    json_path = os.path.join(PROJECT_BASE_DIR, json_dir)
+    logger.info("Processing JSON files from: %s", json_path)
+
+    # Load the user's documents with their images and tables in a fixed number of
+    # queries, instead of a lookup plus two related queries per document
+    docs_by_title = {
+        doc.title: doc
+        for doc in PlumbingDocument.objects.filter(user=user).prefetch_related("images", "tables")
+    }
 
+    docs = []
     for filename in os.listdir(json_path):
         if not filename.endswith(".json"):
             continue
 
         file_path = os.path.join(json_path, filename)
         try:
-            with open(file_path, "r") as f:
-                json_content = json.load(f)
+            json_content = read_json(file_path)
 
             # Check if document already exists
             doc_title = filename.replace(".json", "")
-            doc, created = PlumbingDocument.objects.get_or_create(
-                title=doc_title, user=user, defaults={"json_content": json_content}
-            )
+            doc = docs_by_title.get(doc_title)
 
-            if created:
-                logger.info(f"Created new document: {doc.title}")
+            if doc is None:
+                doc = PlumbingDocument.objects.create(
+                    title=doc_title, user=user, json_content=json_content
+                )
+                logger.info("Created new document: %s", doc.title)
             else:
                 # Update existing document
                 doc.json_content = json_content
                 doc.save()
-                logger.info(f"Updated existing document: {doc.title}")
+                logger.info("Updated existing document: %s", doc.title)
 
-            # Process related images and tables for this document
-            process_images_for_document(doc)
-            process_tables_for_document(doc)
+            docs.append(doc)
 
         except Exception as e:
-            logger.error(f"Error processing {filename}: {str(e)}")
+            logger.error("Error processing %s: %s", filename, e)
+
+    # Process related images and tables for all documents together
+    process_all_documents(docs)
+
+
+def store_image(img: PlumbingImage, source_path: str, source_filename: str) -> None:
+    """Point an image record at a source file without saving the record.
+
+    The source is hardlinked to the name Django would generate for it, so the
+    bytes are never copied through Python. If the storage has no local path or
+    the link fails (another filesystem, name already taken), the file is saved
+    through the storage API instead.
+    """
+    storage = img.image.storage
+    target_name = img.image.field.generate_filename(img, source_filename)
+
+    # Delete old file if it exists, unless it is the source itself
+    if img.image and storage.exists(img.image.name):
+        try:
+            is_source = os.path.samefile(storage.path(img.image.name), source_path)
+        except NotImplementedError:
+            is_source = False
+        if not is_source:
+            storage.delete(img.image.name)
+
+    try:
+        target_path = storage.path(target_name)
+        if not (os.path.exists(target_path) and os.path.samefile(target_path, source_path)):
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            os.link(source_path, target_path)
+        img.image.name = target_name
+    except (OSError, NotImplementedError):
+        with open(source_path, "rb") as f:
+            # Let Django handle the file naming
+            img.image.save(source_filename, File(f), save=False)
 
 
 def process_images_for_document(
     doc: PlumbingDocument,
+    page_files: Optional[Dict[int, str]] = None,
 ) -> None:
-    """Process images for a given document."""
-    image_path = settings.PLUMBING_CODE_PATHS["final_jpg"]
-    doc_prefix = doc.title.split("_")[0].replace("CH", "ch")
+    """Process images for a given document.
 
-    logger.info(f"Processing images from: {image_path}")
-    logger.info(f"Looking for images with prefix: {doc_prefix}")
+    page_files maps page numbers to filenames; if it is not given the image
+    directory is scanned for this document.
+    """
+    image_path = plumbing_code_path("final_jpg")
+    doc_prefix = _doc_prefix(doc)
+
+    logger.info("Processing images from: %s", image_path)
+    logger.info("Looking for images with prefix: %s", doc_prefix)
 
     # First, get existing images for this document
     existing_images = {img.page_number: img for img in doc.images.all()}
 
-    # Track which files we've found for each page
-    page_files = {}
-
     # First pass: catalog all files by page number
-    for filename in os.listdir(image_path):
-        if not filename.endswith(".jpg") or not filename.lower().startswith(doc_prefix.lower()):
-            continue
-
-        page_number = extract_page_number(filename)
-        if page_number is None:
-            continue
-
-        # Prefer files without random suffixes
-        if page_number not in page_files or "_" not in filename:
-            page_files[page_number] = filename
-
-    # Second pass: process files
+    if page_files is None:
+        prefix_l = doc_prefix.lower()
+        index = _index_dir(image_path, ".jpg", _build_prefix_trie([prefix_l]))
+        page_files = index.get(prefix_l, {})
+
+    # Second pass: store files, collecting rows to write in bulk
+    to_create = []
+    to_update = []
     for page_number, source_filename in page_files.items():
         source_path = os.path.join(image_path, source_filename)
         if not os.path.exists(source_path):
-            logger.warning(f"Source file not found: {source_path}")
+            logger.warning("Source file not found: %s", source_path)
             continue
 
         try:
-            with open(source_path, "rb") as f:
-                # If image for this page already exists, update it
-                if page_number in existing_images:
-                    img = existing_images[page_number]
-                    # Delete old file if it exists
-                    if img.image:
-                        storage = img.image.storage
-                        if storage.exists(img.image.name):
-                            storage.delete(img.image.name)
-                    # Let Django handle the file naming
-                    img.image.save(source_filename, File(f), save=True)
-                    logger.info(f"Updated existing image for page {page_number}")
-                else:
-                    # Create new image record
-                    img = PlumbingImage(document=doc, page_number=page_number)
-                    # Let Django handle the file naming
-                    img.image.save(source_filename, File(f), save=True)
-                    logger.info(f"Created new image for page {page_number}")
+            # If image for this page already exists, update it
+            if page_number in existing_images:
+                img = existing_images[page_number]
+                store_image(img, source_path, source_filename)
+                to_update.append(img)
+                logger.info("Updated existing image for page %s", page_number)
+            else:
+                # Create new image record
+                img = PlumbingImage(document=doc, page_number=page_number)
+                store_image(img, source_path, source_filename)
+                to_create.append(img)
+                logger.info("Created new image for page %s", page_number)
 
         except Exception as e:
-            logger.error(f"Error processing image {source_filename}: {str(e)}")
+            logger.error("Error processing image %s: %s", source_filename, e)
+
+    # bulk_update skips save() and so auto_now; stamp updated_at by hand
+    now = timezone.now()
+    for img in to_update:
+        img.updated_at = now
+
+    with transaction.atomic():
+        PlumbingImage.objects.bulk_update(to_update, ["image", "updated_at"])
+        PlumbingImage.objects.bulk_create(to_create)
+
 
+def process_tables_for_document(
+    doc: PlumbingDocument,
+    page_files: Optional[Dict[int, str]] = None,
+) -> None:
+    """Process CSV tables for a given document.
 
-def process_tables_for_document(doc: PlumbingDocument) -> None:
-    """Process CSV tables for a given document."""
-    table_path = settings.PLUMBING_CODE_PATHS["tables"]
-    doc_prefix = doc.title.split("_")[0].replace("CH", "ch")
+    page_files maps page numbers to filenames; if it is not given the table
+    directory is scanned for this document.
+    """
+    table_path = plumbing_code_path("tables")
+    doc_prefix = _doc_prefix(doc)
 
-    logger.info(f"Processing tables from: {table_path}")
-    logger.info(f"Looking for tables with prefix: {doc_prefix}")
+    logger.info("Processing tables from: %s", table_path)
+    logger.info("Looking for tables with prefix: %s", doc_prefix)
 
     # Track which pages we've processed
-    page_files = {}
     processed_pages = set()
 
     # First pass: catalog all files by page number
-    for filename in os.listdir(table_path):
-        if not filename.endswith(".csv") or not filename.lower().startswith(doc_prefix.lower()):
-            continue
+    if page_files is None:
+        prefix_l = doc_prefix.lower()
+        index = _index_dir(table_path, ".csv", _build_prefix_trie([prefix_l]))
+        page_files = index.get(prefix_l, {})
 
-        page_number = extract_page_number(filename)
-        if page_number is None:
-            continue
-
-        # Prefer files without random suffixes
-        if page_number not in page_files or "_" not in filename:
-            page_files[page_number] = filename
+    # Existing tables for this document, keyed by page
+    existing_tables = {table.page_number: table for table in doc.tables.all()}
 
-    # Second pass: process files
+    # Second pass: read files, collecting rows to write in bulk
+    to_create = []
+    to_update = []
     for page_number, source_filename in page_files.items():
         file_path = os.path.join(table_path, source_filename)
-        if not os.path.exists(file_path):
-            logger.warning(f"Source file not found: {file_path}")
-            continue
-
         try:
-            with open(file_path, "r") as f:
-                csv_content = f.read()
-
-            # Try to get existing table first
-            try:
-                table = PlumbingTable.objects.get(document=doc, page_number=page_number)
-                logger.info(f"Updating existing table for page {page_number}")
-            except PlumbingTable.DoesNotExist:
+            # Open directly instead of checking exists() first: one syscall, no race
+            csv_content = read_text(file_path)
+
+            # Update the existing table or queue a new one
+            if page_number in existing_tables:
+                table = existing_tables[page_number]
+                table.csv_content = csv_content
+                to_update.append(table)
+                logger.info("Updating existing table for page %s", page_number)
+            else:
                 table = PlumbingTable(document=doc, page_number=page_number)
-                logger.info(f"Creating new table for page {page_number}")
-
-            # Update the content and save
-            table.csv_content = csv_content
-            table.save()
+                table.csv_content = csv_content
+                to_create.append(table)
+                logger.info("Creating new table for page %s", page_number)
             processed_pages.add(page_number)
 
+        except FileNotFoundError:
+            logger.warning("Source file not found: %s", file_path)
         except Exception as e:
-            logger.error(f"Error processing table {source_filename}: {str(e)}")
+            logger.error("Error processing table %s: %s", source_filename, e)
+
+    # csv_content is not a model field, so like save() before it this only
+    # touches updated_at, which bulk_update does not stamp on its own
+    now = timezone.now()
+    for table in to_update:
+        table.updated_at = now
+    if to_create:
+        # PlumbingTable.save() creates the upload directory; bulk_create skips it
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "plumbing_code", "final_csv"), exist_ok=True)
+
+    with transaction.atomic():
+        PlumbingTable.objects.bulk_update(to_update, ["updated_at"])
+        PlumbingTable.objects.bulk_create(to_create)
+
+        # Clean up any tables in database that weren't in source files; delete
+        # each one so PlumbingTable.delete() also removes its CSV file
+        for page_number, table in existing_tables.items():
+            if page_number not in processed_pages:
+                logger.info("Removing obsolete table for page %s", page_number)
+                table.delete()
+
+
+def _index_dir_or_log(
+    directory: str, suffix: str, trie: Dict
+) -> Optional[Dict[str, Dict[int, str]]]:
+    """Like _index_dir, but log a directory that cannot be scanned and return None."""
+    try:
+        return _index_dir(directory, suffix, trie)
+    except OSError as e:
+        logger.error("Error scanning %s: %s", directory, e)
+        return None
+
+
+def process_all_documents(docs: Iterable[PlumbingDocument]) -> None:
+    """Process images and tables for several documents in one pass.
 
-    # Clean up any tables in database that weren't in source files
-    for table in doc.tables.all():
-        if table.page_number not in processed_pages:
-            logger.info(f"Removing obsolete table for page {table.page_number}")
-            table.delete()
+    The image and table directories are each scanned once up front and every file
+    is routed to its document by a longest-prefix match in a trie of the
+    documents' lowercased prefixes.
+    """
+    docs_by_prefix: Dict[str, List[PlumbingDocument]] = {}
+    for doc in docs:
+        docs_by_prefix.setdefault(_doc_prefix(doc).lower(), []).append(doc)
+    trie = _build_prefix_trie(docs_by_prefix)
+
+    image_index = _index_dir_or_log(plumbing_code_path("final_jpg"), ".jpg", trie)
+    table_index = _index_dir_or_log(plumbing_code_path("tables"), ".csv", trie)
+
+    # One document's failure is logged and does not stop the others
+    for prefix, prefix_docs in docs_by_prefix.items():
+        for doc in prefix_docs:
+            try:
+                if image_index is not None:
+                    process_images_for_document(doc, page_files=image_index.get(prefix, {}))
+                if table_index is not None:
+                    process_tables_for_document(doc, page_files=table_index.get(prefix, {}))
+            except Exception as e:
+                logger.error("Error processing files for %s: %s", doc.title, e)
 
 
 def process_all_data(user: User) -> None:
@@ -206,7 +444,7 @@ def process_all_data(user: User) -> None:
         process_json_files(user)
         logger.info("Data processing completed successfully!")
     except Exception as e:
-        logger.error(f"Error during data processing: {str(e)}")
+        logger.error("Error during data processing: %s", e)
 
 
 def main():
@@ -216,9 +454,9 @@ def main():
         default_user = User.objects.get(username=settings.DEFAULT_USERNAME)
         process_json_files(default_user)
     except User.DoesNotExist:
-        logger.error(f"Error: User '{settings.DEFAULT_USERNAME}' not found in database")
+        logger.error("Error: User '%s' not found in database", settings.DEFAULT_USERNAME)
     except Exception as e:
-        logger.error(f"Error: {str(e)}")
+        logger.error("Error: %s", e)
 
 
 if __name__ == "__main__":
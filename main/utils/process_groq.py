@@ -1,150 +1,408 @@
 #!/usr/bin/env python3
 """Script to process images using Groq AI and update JSON files."""
 
-import json
+import asyncio
+import fnmatch
+import hashlib
 import logging
 import os
+import shutil
 import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 # Add project root to Python path
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(BASE_DIR))
 
-# Configure Django settings first
+# Configure Django settings first; the app registry is only set up on first use
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.dev")
 import django  # noqa: E402
 
-django.setup()
-
 # Import Django settings and other dependencies
+import orjson  # noqa: E402
 from django.conf import settings  # noqa: E402
 
-from main.utils.image_groq import GroqImageProcessor  # noqa: E402
+from main.utils.file_io import dump_json, read_json, write_json  # noqa: E402
+from main.utils.image_groq import PROMPT_VERSION, GroqImageProcessor  # noqa: E402
 
-# Configure logger after Django setup
+# Logging handlers are configured by django.setup()
 logger = logging.getLogger("main.utils.process_groq")
 
-# Groq API configuration
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY environment variable is required")
+_DJANGO_READY = False
 
-# Initialize Groq processor
-groq_processor = GroqImageProcessor()
 
+def _ensure_django() -> None:
+    """Set up Django on first use instead of at import time."""
+    global _DJANGO_READY
+    if not _DJANGO_READY:
+        django.setup()
+        _DJANGO_READY = True
 
-def analyze_image_with_groq(image_path: str) -> Optional[str]:
-    """Analyze image using Groq AI API."""
-    try:
-        logger.info(f"Analyzing image: {image_path}")
 
-        # Process the image using GroqImageProcessor
-        result = groq_processor.process_image(image_path)
-        if result:
-            # Extract relevant information from the result
-            analysis = result.get("analysis", "No analysis available")
-            return analysis
+# Concurrent in-flight Groq requests and retry policy for failed requests
+GROQ_CONCURRENCY = 8
+GROQ_FILE_WORKERS = int(os.getenv("GROQ_WORKERS", "8"))  # JSON files processed at once
+GROQ_FORCE = os.getenv("GROQ_FORCE", "").lower() in ("1", "true", "yes")  # Ignore mtimes
+GROQ_MAX_RETRIES = 3
+GROQ_RETRY_DELAY = 1.0  # Seconds, doubled after each failed attempt
+GROQ_BATCH_SIZE = 4  # Images sent together in one request
 
-        return None
+# Analyses keyed by image content and prompt version, so re-runs skip the API
+_analysis_cache: Dict[str, str] = {}
+# Requests in flight by cache key, so concurrent files share one call per image
+_pending_analyses: Dict[str, "asyncio.Future[Optional[str]]"] = {}
 
-    except Exception as e:
-        logger.error(f"Error analyzing image {image_path}: {str(e)}")
+
+@lru_cache(maxsize=None)
+def groq_processor() -> GroqImageProcessor:
+    """Create the Groq processor on first use; its async HTTP client is shared by all requests."""
+    return GroqImageProcessor()
+
+
+@lru_cache(maxsize=None)
+def json_final_dir() -> Path:
+    """Return the directory that receives the *_groq.json outputs."""
+    _ensure_django()
+    return Path(settings.PLUMBING_CODE_PATHS["json_final"])
+
+
+@lru_cache(maxsize=None)
+def groq_cache_dir() -> Path:
+    """Return the directory holding analyses cached by image content."""
+    _ensure_django()
+    return Path(settings.PLUMBING_CODE_DIR) / "groq_cache"
+
+
+def image_cache_key(image_path: str) -> str:
+    """Hash the image bytes together with the prompt version."""
+    stat = os.stat(image_path)
+    return _hash_image(image_path, stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=1024)
+def _hash_image(image_path: str, size: int, mtime_ns: int) -> str:
+    """Hash an image; size and mtime are part of the key so rewritten files rehash."""
+    with open(image_path, "rb") as f:
+        digest = hashlib.sha256(f.read())
+    digest.update(PROMPT_VERSION.encode())
+    return digest.hexdigest()
+
+
+def _cache_file(key: str) -> Path:
+    return groq_cache_dir() / key[:2] / f"{key}.json"
+
+
+def read_cached_analysis(key: str) -> Optional[str]:
+    """Return a previously stored analysis from memory or disk."""
+    if key in _analysis_cache:
+        return _analysis_cache[key]
+
+    try:
+        with open(_cache_file(key), "rb") as f:
+            analysis = orjson.loads(f.read())["t"]
+    except (OSError, ValueError, KeyError):
         return None
 
+    _analysis_cache[key] = analysis
+    return analysis
+
+
+def lookup_analyses(image_paths: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """Return (cache key, cached analysis or None) for each image."""
+    return [(key, read_cached_analysis(key)) for key in map(image_cache_key, image_paths)]
+
+
+def write_cached_analysis(key: str, analysis: str) -> None:
+    """Store an analysis in memory and atomically on disk."""
+    _analysis_cache[key] = analysis
+
+    cache_file = _cache_file(key)
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".tmp")
+    with open(tmp_file, "wb") as f:
+        f.write(dump_json({"t": analysis, "v": PROMPT_VERSION}))
+    os.replace(tmp_file, cache_file)
+
+
+def write_cached_analyses(results: List[Tuple[str, str]]) -> None:
+    """Store several analyses; a failed cache write only costs a later API call."""
+    for key, analysis in results:
+        try:
+            write_cached_analysis(key, analysis)
+        except OSError as e:
+            logger.warning("Could not cache analysis %s: %s", key, e)
+
+
+async def analyze_images_with_groq(
+    image_paths: List[str], semaphore: asyncio.Semaphore
+) -> List[Optional[str]]:
+    """Analyze images using Groq AI API, reusing cached and in-flight results."""
+    loop = asyncio.get_running_loop()
+    # Hashing images and reading cache files is blocking I/O; keep it off the loop
+    cache_hits = await asyncio.to_thread(lookup_analyses, image_paths)
+
+    futures = []
+    misses = []
+    for image_path, (key, cached) in zip(image_paths, cache_hits):
+        # Another file's request may have finished while the lookup ran
+        cached = cached or _analysis_cache.get(key)
+        if cached is not None:
+            logger.debug("Using cached analysis for image: %s", image_path)
+            future = loop.create_future()
+            future.set_result(cached)
+        elif key in _pending_analyses:
+            future = _pending_analyses[key]
+        else:
+            future = loop.create_future()
+            _pending_analyses[key] = future
+            misses.append((image_path, key, future))
+        futures.append(future)
+
+    # Send the uncached images GROQ_BATCH_SIZE at a time
+    batches = [misses[i : i + GROQ_BATCH_SIZE] for i in range(0, len(misses), GROQ_BATCH_SIZE)]
+    await asyncio.gather(*(request_batch(batch, semaphore) for batch in batches))
+
+    return list(await asyncio.gather(*futures))
 
-def process_json_file(json_file: Path) -> bool:
+
+async def request_batch(
+    batch: List[Tuple[str, str, "asyncio.Future[Optional[str]]"]],
+    semaphore: asyncio.Semaphore,
+) -> None:
+    """Request analyses for a batch of images and resolve their futures."""
+    try:
+        analyses = await request_analyses([image_path for image_path, _, _ in batch], semaphore)
+        results = []
+        for (_, key, future), analysis in zip(batch, analyses):
+            if analysis:
+                # In memory right away, so no other file re-requests it before the write
+                _analysis_cache[key] = analysis
+                results.append((key, analysis))
+            future.set_result(analysis or None)
+        await asyncio.to_thread(write_cached_analyses, results)
+    finally:
+        for _, key, future in batch:
+            if not future.done():
+                future.set_result(None)
+            _pending_analyses.pop(key, None)
+
+
+async def request_analyses(
+    image_paths: List[str], semaphore: asyncio.Semaphore
+) -> List[Optional[str]]:
+    """Request analyses from Groq, retrying failed requests with backoff."""
+    async with semaphore:
+        logger.info("Analyzing images: %s", ", ".join(image_paths))
+
+        for attempt in range(GROQ_MAX_RETRIES):
+            try:
+                # Analyze the images using GroqImageProcessor
+                return await groq_processor().analyze_images_async(image_paths)
+
+            except Exception as e:
+                if attempt + 1 == GROQ_MAX_RETRIES:
+                    logger.error("Error analyzing images %s: %s", ", ".join(image_paths), e)
+                    break
+                delay = GROQ_RETRY_DELAY * 2**attempt
+                logger.warning("Retrying images in %ss after error: %s", delay, e)
+                await asyncio.sleep(delay)
+
+    return [None] * len(image_paths)
+
+
+def existing_files(paths: Iterable[str]) -> Set[str]:
+    """Return the given paths that exist, listing each parent directory once."""
+    by_dir: Dict[str, Dict[str, List[str]]] = {}
+    for path in paths:
+        directory, name = os.path.split(path)
+        by_dir.setdefault(directory, {}).setdefault(name, []).append(path)
+
+    existing = set()
+    for directory, names in by_dir.items():
+        try:
+            with os.scandir(directory or ".") as entries:
+                for entry in entries:
+                    if entry.name in names:
+                        existing.update(names[entry.name])
+        except OSError:
+            continue
+    return existing
+
+
+def incomplete_marker(output_file: Path) -> Path:
+    """Sidecar recording that output_file is missing some Groq analyses."""
+    return output_file.with_name(f"{output_file.name}.incomplete")
+
+
+def is_up_to_date(output_file: Path, json_file: Path, image_paths: Iterable[str]) -> bool:
+    """Check whether output_file is complete and newer than the JSON file and its images."""
+    try:
+        # Outputs with failed analyses are retried until every analysis succeeds
+        if os.path.exists(incomplete_marker(output_file)):
+            return False
+        output_stat = os.stat(output_file)
+        json_stat = os.stat(json_file)
+        # A hardlinked pass-through shares the input's mtime; always re-check it
+        if os.path.samestat(output_stat, json_stat):
+            return False
+        if json_stat.st_mtime > output_stat.st_mtime:
+            return False
+        return all(os.stat(path).st_mtime <= output_stat.st_mtime for path in image_paths)
+    except OSError:
+        return False
+
+
+def link_or_copy(source: Path, target: Path) -> None:
+    """Hardlink source to target, falling back to a copy across filesystems."""
+    try:
+        os.remove(target)
+    except FileNotFoundError:
+        pass
+
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+async def process_json_file(json_file: Path, semaphore: asyncio.Semaphore) -> bool:
     """Process a single JSON file and update with Groq analysis."""
+    # Only the Groq requests are awaited natively. Local JSON reads and writes stay
+    # plain blocking open() calls run on the default executor: async file APIs such
+    # as aiofiles wrap the same blocking calls in a thread pool with extra overhead
+    # and benchmark slower than sync I/O, so do not switch these over to them.
     try:
-        logger.info(f"Processing JSON file: {json_file}")
+        logger.info("Processing JSON file: %s", json_file)
+
+        # Output filename with _groq suffix in json_final directory
+        output_file = json_final_dir() / f"{json_file.stem}_groq.json"
 
         # Read the JSON file
-        with open(json_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = await asyncio.to_thread(read_json, json_file)
 
         modified = False
 
-        # Process each file entry
-        for file_entry in data.get("f", []):
-            # Skip entries without table path
-            if not file_entry.get("p"):
-                logger.debug(f"Skipping entry {file_entry.get('i')}: no table path")
-                continue
-
-            # Get the image path from 'o' field
-            image_path = file_entry.get("o")
-            if not image_path:
-                logger.warning(f"No image path for entry {file_entry.get('i')}")
-                continue
-
-            # Check if image exists
-            if not Path(image_path).exists():
-                logger.warning(f"Image not found: {image_path}")
-                continue
-
-            # Analyze image with Groq
-            analysis = analyze_image_with_groq(image_path)
+        # Collect entries that need analysis: a table path ('p') and an image path ('o').
+        # Most entries have no table path, so they are skipped without further lookups.
+        tabled = [file_entry for file_entry in data.get("f", ()) if file_entry.get("p")]
+        pending = [
+            (file_entry, image_path)
+            for file_entry in tabled
+            if (image_path := file_entry.get("o"))
+        ]
+        if len(pending) < len(tabled):
+            for file_entry in tabled:
+                if not file_entry.get("o"):
+                    logger.warning("No image path for entry %s", file_entry.get("i"))
+
+        # Keep entries whose image exists, with one directory scan per image folder
+        existing = existing_files(image_path for _, image_path in pending)
+        if len(existing) < len(pending):
+            for _, image_path in pending:
+                if image_path not in existing:
+                    logger.warning("Image not found: %s", image_path)
+            pending = [item for item in pending if item[1] in existing]
+
+        # Skip files whose output is newer than the JSON and every image it references
+        if not GROQ_FORCE and await asyncio.to_thread(
+            is_up_to_date, output_file, json_file, existing
+        ):
+            logger.info("Output is up to date, skipping: %s", output_file)
+            return True
+
+        # Analyze each distinct image once; the calls are network-bound, so keep them in flight
+        image_paths = list(dict.fromkeys(image_path for _, image_path in pending))
+        analyses = await analyze_images_with_groq(image_paths, semaphore)
+        results = dict(zip(image_paths, analyses))
+
+        # Flag the output before writing it if any analysis failed, so the next run
+        # retries those images instead of treating the output as current
+        marker = incomplete_marker(output_file)
+        complete = all(results.values())
+        if not complete:
+            logger.warning("Some Groq analyses failed; %s will be retried", output_file)
+            await asyncio.to_thread(marker.touch)
+
+        for file_entry, image_path in pending:
+            analysis = results[image_path]
             if analysis:
                 # Update the text content
                 file_entry["t"] = analysis
                 modified = True
-                logger.info(f"Updated entry {file_entry.get('i')} with Groq analysis")
-
-        # Create output filename with _groq suffix in json_final directory
-        output_dir = Path(settings.PLUMBING_CODE_PATHS["json_final"])
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output_file = output_dir / f"{json_file.stem}_groq.json"
-
-        # Save the file (whether modified or not)
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+                logger.info("Updated entry %s with Groq analysis", file_entry.get("i"))
 
+        # Save the results, or pass the unchanged input through without re-encoding it
         if modified:
-            logger.info(f"Successfully saved results to {output_file}")
+            await asyncio.to_thread(write_json, output_file, data)
+            logger.info("Successfully saved results to %s", output_file)
         else:
-            logger.info(f"No changes needed, copied original file to {output_file}")
+            await asyncio.to_thread(link_or_copy, json_file, output_file)
+            logger.info("No changes needed, copied original file to %s", output_file)
+
+        if complete:
+            await asyncio.to_thread(marker.unlink, missing_ok=True)
 
         return True
 
     except Exception as e:
-        logger.error(f"Error processing JSON file {json_file}: {str(e)}")
+        logger.error("Error processing JSON file %s: %s", json_file, e)
         return False
 
 
-def main() -> bool:
-    """Process all JSON files with Groq analysis."""
+async def process_all_json_files(json_files: List[Path]) -> Tuple[int, int]:
+    """Process JSON files concurrently, sharing one request limit across all of them."""
+    semaphore = asyncio.Semaphore(GROQ_CONCURRENCY)
+    file_slots = asyncio.Semaphore(GROQ_FILE_WORKERS)
+
+    async def process_with_slot(json_file: Path) -> bool:
+        async with file_slots:
+            return await process_json_file(json_file, semaphore)
+
+    # Each file is independent and process_json_file reports its own errors
+    results = await asyncio.gather(*(process_with_slot(f) for f in json_files))
+
+    successful = sum(results)
+    return successful, len(results) - successful
+
+
+def main(pattern: str = "NYCP*CH.json") -> bool:
+    """Process all JSON files matching pattern with Groq analysis."""
+    if not os.getenv("GROQ_API_KEY"):
+        raise ValueError("GROQ_API_KEY environment variable is required")
+
+    _ensure_django()
     try:
         logger.info("=" * 50)
         logger.info("Starting Groq processing")
 
         # Get paths from Django settings
         json_dir = Path(settings.PLUMBING_CODE_PATHS["json_processed"])
-        logger.info(f"JSON directory: {json_dir}")
+        logger.info("JSON directory: %s", json_dir)
 
-        # Get list of JSON files to process
-        json_files = list(json_dir.glob("NYCP*CH.json"))
-        logger.info(f"Found {len(json_files)} JSON files to process")
+        # Get list of JSON files to process in a single directory pass
+        with os.scandir(json_dir) as entries:
+            json_files = [
+                Path(entry.path)
+                for entry in entries
+                if fnmatch.fnmatchcase(entry.name, pattern) and entry.is_file(follow_symlinks=False)
+            ]
+        logger.info("Found %s JSON files to process", len(json_files))
 
-        successful = 0
-        failed = 0
+        json_final_dir().mkdir(parents=True, exist_ok=True)
 
-        # Process each JSON file
-        for json_file in json_files:
-            if process_json_file(json_file):
-                successful += 1
-            else:
-                failed += 1
+        successful, failed = asyncio.run(process_all_json_files(json_files))
 
         logger.info("Groq processing complete")
-        logger.info(f"Successfully processed: {successful}")
-        logger.info(f"Failed to process: {failed}")
+        logger.info("Successfully processed: %s", successful)
+        logger.info("Failed to process: %s", failed)
         logger.info("=" * 50)
 
         return successful > 0 or len(json_files) == 0
 
     except Exception as e:
-        logger.error(f"Error in main process: {str(e)}")
+        logger.error("Error in main process: %s", e)
         return False
 
 
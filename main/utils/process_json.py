@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 """Script to process text files and tables into JSON format."""
 
-import json
 import logging
 import os
 import re
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -20,10 +21,14 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", DJANGO_SETTINGS_MODULE)
 
 # Django imports
 import django  # noqa: E402
+from django.apps import apps  # noqa: E402
 from django.conf import settings  # noqa: E402
 
-# Set up Django environment
-django.setup()
+from main.utils.file_io import read_text, write_json  # noqa: E402
+
+# Set up Django environment, unless the importing process already has
+if not apps.ready:
+    django.setup()
 
 # Configure logger
 logger = logging.getLogger("main.utils.process_json")
@@ -45,33 +50,33 @@ if not any(isinstance(handler, logging.FileHandler) for handler in logger.handle
     logger.setLevel(logging.INFO)
 
 
+CHAPTER_WORKERS = os.cpu_count() or 1  # Chapters converted in parallel
+
+# Filename patterns, compiled once
+_CHAPTER_RE = re.compile(r"NYCP(\d+)ch_.*")
+_TABLE_PAGE_RE = re.compile(r"NYCP(\d*)ch_(\d+)pg\.csv$")
+_TEXT_PAGE_RE = re.compile(r"_(\d+)pg\.txt$")
+
+
 def extract_chapter_info(filename: str) -> Tuple[str, str]:
     """Extract chapter number and type from filename."""
-    match = re.match(r"NYCP(\d+)ch_.*", filename)
+    match = _CHAPTER_RE.match(filename)
     if match:
         chapter = match.group(1)
         return chapter, "NYCPC"
     return "", ""
 
 
-def find_matching_table(file_entry: Dict, chapter_num: str, tables_dir: Path) -> Optional[Path]:
-    """Find matching table file for a given file entry."""
-    # Get all table files in the directory
-    table_files = list(tables_dir.glob(f"NYCP{chapter_num}ch_*pg.csv"))
-
-    # Extract page number from the file entry
-    page_num = file_entry.get("i", 1)
-
-    # Try to find a matching table file
-    for table_file in table_files:
+def index_tables(chapter_num: str, tables_dir: Path) -> Dict[int, Path]:
+    """Map page numbers to the chapter's table files, scanning the directory once."""
+    table_by_page: Dict[int, Path] = {}
+    for table_file in tables_dir.glob(f"NYCP{chapter_num}ch_*pg.csv"):
         # Extract page number from table filename
-        table_match = re.search(rf"NYCP{chapter_num}ch_(\d+)pg\.csv$", table_file.name)
-        if table_match:
-            table_page = int(table_match.group(1))
-            if table_page == page_num:
-                return table_file
-
-    return None
+        table_match = _TABLE_PAGE_RE.search(table_file.name)
+        if table_match and table_match.group(1) == chapter_num:
+            # Keep the first file found for a page, as the per-entry search did
+            table_by_page.setdefault(int(table_match.group(2)), table_file)
+    return table_by_page
 
 
 def find_table_file(chapter_num: str, tables_dir: Path) -> Optional[Path]:
@@ -91,21 +96,21 @@ def process_files(input_files: List[Path], output_dir: Path) -> bool:
         # Extract chapter info from first file
         chapter, doc_type = extract_chapter_info(input_files[0].name)
 
-        # Get tables directory
+        # Get tables directory and index its tables for this chapter once
         tables_dir = Path(settings.PLUMBING_CODE_PATHS["tables"])
+        table_by_page = index_tables(chapter, tables_dir)
 
         # Create files array
         files_data = []
         for i, input_file in enumerate(sorted(input_files), 1):
             try:
-                logger.info(f"Processing file: {input_file}")
+                logger.debug("Processing file: %s", input_file)
 
                 # Read the input file
-                with open(input_file, "r", encoding="utf-8") as f:
-                    content = f.read()
+                content = read_text(input_file)
 
                 # Extract page number from filename
-                page_match = re.search(r"_(\d+)pg\.txt$", input_file.name)
+                page_match = _TEXT_PAGE_RE.search(input_file.name)
                 page_num = int(page_match.group(1)) if page_match else i
 
                 # Create optimizer path
@@ -119,16 +124,18 @@ def process_files(input_files: List[Path], output_dir: Path) -> bool:
                 }
 
                 # Find matching table file using both chapter and page number
-                table_file = find_matching_table(file_data, chapter, tables_dir)
+                table_file = table_by_page.get(page_num)
                 file_data["p"] = str(table_file) if table_file else None
 
                 files_data.append(file_data)
-                logger.info(f"Successfully processed: {input_file.name}")
+                logger.debug("Successfully processed: %s", input_file.name)
                 if table_file:
-                    logger.info(f"Found matching table file: {table_file.name} for page {page_num}")
+                    logger.debug(
+                        "Found matching table file: %s for page %s", table_file.name, page_num
+                    )
                 else:
-                    logger.info(
-                        f"No matching table file found for chapter {chapter}, page {page_num}"
+                    logger.debug(
+                        "No matching table file found for chapter %s, page %s", chapter, page_num
                     )
 
             except Exception as e:
@@ -143,10 +150,16 @@ def process_files(input_files: List[Path], output_dir: Path) -> bool:
 
         # Save as JSON
         output_file = output_dir / f"NYCP{chapter}CH_.json"
-        logger.info(f"Saving JSON to: {output_file}")
-
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        write_json(output_file, data)
+
+        # One summary line per chapter; per-file progress is logged at DEBUG
+        logger.info(
+            "Saved %s: %d of %d files, %d with tables",
+            output_file,
+            len(files_data),
+            len(input_files),
+            sum(1 for file_data in files_data if file_data["p"]),
+        )
 
         return True
 
@@ -160,6 +173,7 @@ def main() -> bool:
     try:
         logger.info("=" * 50)
         logger.info("Starting JSON processing")
+        start = time.perf_counter()
 
         # Get paths from Django settings
         ocr_dir = Path(settings.PLUMBING_CODE_PATHS["ocr"])
@@ -170,38 +184,46 @@ def main() -> bool:
         logger.info(f"Input directory: {ocr_dir}")
         logger.info(f"Output directory: {json_dir}")
 
-        # Get list of text files to process
-        text_files = list(ocr_dir.glob("*.txt"))
-        logger.info(f"Found {len(text_files)} text files to process")
-
-        if not text_files:
+        # List text files and group them by chapter in a single pass
+        text_count = 0
+        files_by_chapter: Dict[str, List[Path]] = {}
+        with os.scandir(ocr_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".txt") or not entry.is_file():
+                    continue
+                text_count += 1
+                match = _CHAPTER_RE.match(entry.name)
+                if match:
+                    files_by_chapter.setdefault(match.group(1), []).append(Path(entry.path))
+        logger.info(f"Found {text_count} text files to process")
+
+        if not text_count:
             logger.info(
                 "No text files found to process - this is normal if OCR hasn't been run yet"
             )
             return True  # Return success since this is an expected state
 
-        # Group files by chapter
-        files_by_chapter = {}
-        for file in text_files:
-            chapter, _ = extract_chapter_info(file.name)
-            if chapter:
-                if chapter not in files_by_chapter:
-                    files_by_chapter[chapter] = []
-                files_by_chapter[chapter].append(file)
-
         successful = 0
         failed = 0
 
-        # Process each chapter's files
-        for chapter_files in files_by_chapter.values():
-            if process_files(chapter_files, json_dir):
-                successful += 1
-            else:
-                failed += 1
+        # Process each chapter's files; chapters are independent, so use all cores
+        with ProcessPoolExecutor(max_workers=CHAPTER_WORKERS) as executor:
+            futures = [
+                executor.submit(process_files, chapter_files, json_dir)
+                for chapter_files in files_by_chapter.values()
+            ]
+            for future in as_completed(futures):
+                if future.result():
+                    successful += 1
+                else:
+                    failed += 1
 
-        logger.info("JSON processing complete")
-        logger.info(f"Successfully processed chapters: {successful}")
-        logger.info(f"Failed to process chapters: {failed}")
+        logger.info(
+            "JSON processing complete: %d chapters succeeded, %d failed in %.1fs",
+            successful,
+            failed,
+            time.perf_counter() - start,
+        )
         logger.info("=" * 50)
 
         return successful > 0 or len(files_by_chapter) == 0
@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 """Script to add table file paths to JSON files."""
 
-import glob
-import json
+import fnmatch
 import logging
 import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -24,13 +24,26 @@ django.setup()
 
 from django.conf import settings  # noqa: E402
 
+from main.utils.file_io import read_json, write_json  # noqa: E402
+
 # Configure logger
 logger = logging.getLogger("main.utils.process_json_wash")
 
+WASH_WORKERS = os.cpu_count() or 1  # Chapter files washed in parallel
+
+# Patterns compiled once: chapter filenames and section headers such as
+# "101.1 Title." or "SECTION PC 101.1 Title"
+_CHAPTER_FILE_RE = re.compile(r"NYCP(\d+)CH")
+_SECTION_RE = re.compile(r"^(?:SECTION PC )?(\d+(?:\.\d+)?)\s+" r"([^.]+)\.?(.*)$")
+# First "CHAPTER" line, then the first following non-blank line that is not a
+# "SECTION" header
+_CHAPTER_LINE_RE = re.compile(r"^\s*CHAPTER", re.MULTILINE)
+_CHAPTER_TITLE_RE = re.compile(r"[^\n]*(?:\n\s*SECTION[^\n]*)*\n\s*(?!SECTION)(\S[^\n]*)")
+
 
 def find_table_file(base_name: str, tables_dir: Path, page_num: int) -> Optional[str]:
     """Find corresponding table file in tables directory."""
-    chapter_match = re.match(r"NYCP(\d+)CH", base_name)
+    chapter_match = _CHAPTER_FILE_RE.match(base_name)
     if not chapter_match:
         return None
 
@@ -56,11 +69,15 @@ def extract_sections(text: str, file_entry: Dict[str, Any]) -> List[Dict]:
     current_content = []
 
     for line in lines:
-        # Look for section headers like "101.1 Title." or "SECTION PC 101.1 Title"
-        section_match = re.match(
-            r"^(?:SECTION PC )?(\d+(?:\.\d+)?)\s+" r"([^.]+)\.?(.*)$",
-            line.strip(),
-        )
+        line = line.strip()
+
+        # Look for section headers like "101.1 Title." or "SECTION PC 101.1 Title";
+        # only lines starting with a digit or "SECTION PC " can match
+        if line[:1].isdigit() or line.startswith("SECTION PC "):
+            section_match = _SECTION_RE.match(line)
+        else:
+            section_match = None
+
         if section_match:
             if current_section:
                 current_section["c"] = "\n".join(current_content).strip()
@@ -79,8 +96,8 @@ def extract_sections(text: str, file_entry: Dict[str, Any]) -> List[Dict]:
             }
             if first_content:
                 current_content.append(first_content)
-        elif current_section and line.strip():
-            current_content.append(line.strip())
+        elif current_section and line:
+            current_content.append(line)
 
     if current_section:
         current_section["c"] = "\n".join(current_content).strip()
@@ -91,24 +108,13 @@ def extract_sections(text: str, file_entry: Dict[str, Any]) -> List[Dict]:
 
 def extract_chapter_title(text: str) -> Optional[str]:
     """Extract chapter title from text content."""
-    # Split into lines and clean them
-    lines = [line.strip() for line in text.split("\n") if line.strip()]
-
-    # Find the chapter line
-    chapter_line_idx = -1
-    for i, line in enumerate(lines):
-        if line.strip().startswith("CHAPTER"):
-            chapter_line_idx = i
-            break
-
-    if chapter_line_idx >= 0:
-        # Look for title in the next non-empty line
-        for i in range(chapter_line_idx + 1, len(lines)):
-            line = lines[i].strip()
-            if line and not line.startswith("SECTION"):
-                return line
+    # Scan the text in place rather than splitting and stripping every line
+    chapter_match = _CHAPTER_LINE_RE.search(text)
+    if not chapter_match:
+        return None
 
-    return None
+    title_match = _CHAPTER_TITLE_RE.match(text, chapter_match.end())
+    return title_match.group(1).rstrip() if title_match else None
 
 
 def process_json_file(json_file: Path, tables_dir: Path) -> bool:
@@ -116,10 +122,9 @@ def process_json_file(json_file: Path, tables_dir: Path) -> bool:
     try:
         logger.info("Processing JSON file: %s", json_file)
 
-        with open(json_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = read_json(json_file)
 
-        chapter_match = re.match(r"NYCP(\d+)CH", json_file.stem.replace("_", ""))
+        chapter_match = _CHAPTER_FILE_RE.match(json_file.stem.replace("_", ""))
         if not chapter_match:
             logger.error("Invalid filename format: %s", json_file.name)
             return False
@@ -153,18 +158,9 @@ def process_json_file(json_file: Path, tables_dir: Path) -> bool:
                     }
                     output_data["f"].append(output_entry)
 
-                    # Extract sections from this file's text
+                    # Extract sections from this file's text; they are already in output form
                     if "t" in file_entry:
-                        sections = extract_sections(file_entry["t"], file_entry)
-                        for section in sections:
-                            section_entry = {
-                                "i": section["i"],
-                                "t": section["t"],
-                                "f": file_entry.get("i", 1),
-                                "o": file_entry.get("o", ""),
-                                "c": section["c"],
-                            }
-                            output_data["s"].append(section_entry)
+                        output_data["s"].extend(extract_sections(file_entry["t"], file_entry))
 
         # Sort sections by their identifiers
         output_data["s"].sort(key=lambda x: [int(n) for n in x["i"].split(".")])
@@ -176,8 +172,7 @@ def process_json_file(json_file: Path, tables_dir: Path) -> bool:
         processed_file = os.path.join(processed_dir, output_filename)
 
         logger.info(f"Saving processed JSON to: {processed_file}")
-        with open(processed_file, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        write_json(processed_file, output_data, indent=True)
         logger.info(f"Successfully saved processed JSON to: {processed_file}")
 
         return True
@@ -205,20 +200,29 @@ def main() -> bool:
         logger.info("Output JSON directory: %s", json_processed_dir)
         logger.info("Tables directory: %s", tables_dir)
 
-        # Look for input files (with underscore)
-        pattern = os.path.join(json_dir, "NYCP*CH_.json")
-        json_files = glob.glob(pattern)
+        # Look for input files (with underscore), NYCP*CH_.json, in one directory pass
+        with os.scandir(json_dir) as entries:
+            json_files = [
+                entry.path
+                for entry in entries
+                if fnmatch.fnmatchcase(entry.name, "NYCP*CH_.json") and entry.is_file()
+            ]
         logger.info("Found %s JSON files to process", len(json_files))
 
         successful = 0
         failed = 0
 
-        # Process each JSON file
-        for json_file in json_files:
-            if process_json_file(Path(json_file), Path(tables_dir)):
-                successful += 1
-            else:
-                failed += 1
+        # Process each JSON file; files are independent, so use all cores
+        with ProcessPoolExecutor(max_workers=WASH_WORKERS) as executor:
+            futures = [
+                executor.submit(process_json_file, Path(json_file), Path(tables_dir))
+                for json_file in json_files
+            ]
+            for future in as_completed(futures):
+                if future.result():
+                    successful += 1
+                else:
+                    failed += 1
 
         logger.info("Processing complete")
         logger.info(f"Successfully processed: {successful}")
@@ -61,6 +61,10 @@ if not logger.handlers:
 
     logger.setLevel(logging.INFO)
 
+# Page filename patterns, compiled once: NYCP2ch_1pg -> ("NYCP2ch", "1")
+_DOC_PAGE_RE = re.compile(r"(.+?)_(\d+)pg")
+_PAGE_RE = re.compile(r"(\d+)pg")
+
 
 def analyze_text_patterns(text: str) -> Tuple[bool, float]:
     """Analyze text patterns to detect table-like structures."""
@@ -154,7 +158,7 @@ def process_tables(text: str, image_path: str, tables_dir: str) -> Dict:
             base_name = os.path.splitext(os.path.basename(image_path))[0]
 
             # Extract document title and page number from filename
-            match = re.search(r"(.+?)_(\d+)pg", base_name)
+            match = _DOC_PAGE_RE.search(base_name)
             if not match:
                 raise ValueError(f"Invalid filename format: {base_name}")
 
@@ -234,7 +238,7 @@ def process_image(image_path: str, output_path: str, tables_dir: str) -> Dict:
             # Create or update PlumbingImage
             base_name = os.path.splitext(os.path.basename(image_path))[0]
             doc_title = "_".join(base_name.split("_")[:-1])  # Remove page number part
-            page_number = int(re.search(r"(\d+)pg", base_name).group(1))
+            page_number = int(_PAGE_RE.search(base_name).group(1))
 
             # Get or create the document
             from main.models import PlumbingDocument, PlumbingImage, PlumbingTable
@@ -0,0 +1,101 @@
+"""Tests for int8 embedding quantization and scoring in process_embedjson."""
+
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+# process_embedjson imports embed_open as a top-level module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main.utils import process_embedjson  # noqa: E402
+from main.utils.process_embedjson import (  # noqa: E402
+    _int8_row_norms,
+    _int8_similarity,
+    _quantize_int8,
+)
+
+
+def original_int8_similarity(doc_vectors: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+    """Cosine similarity as computed before blocking, on an int32 copy of the matrix."""
+    docs = doc_vectors.astype(np.int32)
+    query = query_vector.astype(np.int32)
+    doc_norms = np.linalg.norm(docs, axis=1)
+    query_norm = np.linalg.norm(query)
+    denom = doc_norms * query_norm
+    denom[denom == 0] = 1.0
+    return (docs @ query) / denom
+
+
+def cosine_similarity(doc_vectors: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+    """Cosine similarity of unquantized float vectors."""
+    return (doc_vectors @ query_vector) / (
+        np.linalg.norm(doc_vectors, axis=1) * np.linalg.norm(query_vector)
+    )
+
+
+class TestInt8Embeddings(unittest.TestCase):
+    """Test cases for int8 quantization and similarity scoring."""
+
+    def setUp(self):
+        """Set up random embeddings, including an all-zero row."""
+        rng = np.random.default_rng(0)
+        self.vectors = rng.standard_normal((50, 64)).astype(np.float32)
+        self.vectors[7] = 0.0
+        self.query = rng.standard_normal(64).astype(np.float32)
+
+    def test_quantize_int8(self):
+        """Test that quantized rows dequantize to within half a step of the input."""
+        quantized, scales = _quantize_int8(self.vectors)
+        self.assertEqual(quantized.dtype, np.int8)
+        self.assertEqual(scales.dtype, np.float16)
+        self.assertEqual(scales.shape, (50, 1))
+        self.assertEqual(np.abs(quantized).max(axis=1)[0], 127)
+        self.assertFalse(quantized[7].any())
+        self.assertEqual(scales[7, 0], 1.0)
+
+        restored = quantized * scales.astype(np.float32)
+        # float16 scales add a relative error of up to 2**-11 on top of the rounding
+        tolerance = scales.astype(np.float32) * (0.5 + 127 * 2**-11)
+        self.assertTrue(np.all(np.abs(restored - self.vectors) <= tolerance))
+
+    def test_quantize_single_vector(self):
+        """Test that a 1-D query is quantized as a single row."""
+        quantized, scales = _quantize_int8(self.query)
+        self.assertEqual(quantized.shape, (1, 64))
+        self.assertEqual(scales.shape, (1, 1))
+
+    def test_similarity_matches_original(self):
+        """Test that blocked scoring agrees with the original int32 formula."""
+        docs, _ = _quantize_int8(self.vectors)
+        query, _ = _quantize_int8(self.query)
+        expected = original_int8_similarity(docs, query[0])
+
+        # Use a block smaller than the matrix so rows span several blocks
+        with patch.object(process_embedjson, "SIMILARITY_BLOCK_ROWS", 8):
+            np.testing.assert_allclose(_int8_similarity(docs, query[0]), expected, rtol=1e-12)
+            norms = _int8_row_norms(docs)
+            np.testing.assert_allclose(
+                _int8_similarity(docs, query[0], norms), expected, rtol=1e-12
+            )
+
+        np.testing.assert_allclose(norms, np.linalg.norm(docs.astype(np.int32), axis=1))
+        self.assertEqual(_int8_similarity(docs, query[0])[7], 0.0)
+
+    def test_similarity_tracks_float_cosine(self):
+        """Test that int8 scores stay close to the float cosine and keep the best match."""
+        docs, _ = _quantize_int8(self.vectors)
+        query, _ = _quantize_int8(self.query)
+        scores = _int8_similarity(docs, query[0])
+
+        nonzero = np.ones(len(self.vectors), bool)
+        nonzero[7] = False
+        expected = cosine_similarity(self.vectors[nonzero], self.query)
+        np.testing.assert_allclose(scores[nonzero], expected, atol=0.02)
+        self.assertEqual(np.argmax(scores), np.flatnonzero(nonzero)[np.argmax(expected)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Tests for filename parsing in process_filename."""
+
+import itertools
+import os
+import re
+import tempfile
+import unittest
+
+from django.test import override_settings
+
+from main.utils.process_filename import extract_chapter_page, generate_nycp_name, rename_files
+
+
+def original_extract_chapter_page(filename: str) -> tuple:
+    """Chapter and page parser as it was before the patterns were combined."""
+    name = os.path.splitext(filename)[0]
+
+    patterns = [
+        r"(\d+).*?(\d+)",
+        r"chapter[_]?(\d+)[_]?(\d+)page",
+        r"NYCP(\d+)ch[_](\d+)pg",
+    ]
+
+    for pattern in patterns:
+        match = re.search(pattern, name, re.IGNORECASE)
+        if match:
+            return match.group(1), match.group(2)
+
+    return None, None
+
+
+class TestExtractChapterPage(unittest.TestCase):
+    """Test cases for extract_chapter_page."""
+
+    def test_known_formats(self):
+        """Test the filename formats renamed from the uploads directory."""
+        self.assertEqual(extract_chapter_page("NYCP3ch_4pg.jpg"), ("3", "4"))
+        self.assertEqual(extract_chapter_page("chapter_2_1page.png"), ("2", "1"))
+        self.assertEqual(extract_chapter_page("5Screenshot3.png"), ("5", "3"))
+        self.assertEqual(extract_chapter_page("8...12.jpg"), ("8", "12"))
+        self.assertEqual(extract_chapter_page("chapter23page10.jpg"), ("23", "10"))
+        self.assertEqual(extract_chapter_page("screenshot.png"), (None, None))
+        self.assertEqual(extract_chapter_page("7.png"), (None, None))
+
+    def test_matches_original(self):
+        """Test that the single pattern agrees with the original cascade."""
+        tokens = ["NYCP", "ch", "_", "pg", "chapter", "page", "1", "23", "x", "."]
+        for length in range(1, 5):
+            for parts in itertools.product(tokens, repeat=length):
+                filename = "".join(parts) + ".jpg"
+                with self.subTest(filename=filename):
+                    self.assertEqual(
+                        extract_chapter_page(filename), original_extract_chapter_page(filename)
+                    )
+
+    def test_generate_nycp_name_round_trip(self):
+        """Test that generated names parse back to the same chapter and page."""
+        name = generate_nycp_name("12", "345", ".jpg")
+        self.assertEqual(name, "NYCP12ch_345pg.jpg")
+        self.assertEqual(extract_chapter_page(name), ("12", "345"))
+
+
+class TestRenameFiles(unittest.TestCase):
+    """Test cases for rename_files."""
+
+    def setUp(self):
+        """Set up a temporary uploads directory."""
+        self.uploads_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.uploads_dir.cleanup)
+
+    def _rename(self, files):
+        """Create files (name -> content) in the uploads directory and rename them."""
+        for name, content in files.items():
+            with open(os.path.join(self.uploads_dir.name, name), "w") as f:
+                f.write(content)
+        with override_settings(PLUMBING_CODE_PATHS={"uploads": self.uploads_dir.name}):
+            rename_files()
+        result = {}
+        for name in os.listdir(self.uploads_dir.name):
+            with open(os.path.join(self.uploads_dir.name, name)) as f:
+                result[name] = f.read()
+        return result
+
+    def test_renames_to_nycp_format(self):
+        """Test that uploads are renamed and correctly named files are left alone."""
+        result = self._rename({"5Screenshot6.png": "a", "NYCP3ch_4pg.jpg": "b"})
+        self.assertEqual(result, {"NYCP5ch_6pg.png": "a", "NYCP3ch_4pg.jpg": "b"})
+
+    def test_colliding_names_are_skipped(self):
+        """Test that no upload overwrites another when their NYCP names collide."""
+        result = self._rename(
+            {
+                "chapter_2_1page.png": "chapter",
+                "2_1.png": "numbers",
+                "NYCP3ch_4pg.jpg": "existing",
+                "3_4.jpg": "duplicate",
+            }
+        )
+        # The first claimant by filename wins; the rest keep their names
+        self.assertEqual(
+            result,
+            {
+                "NYCP2ch_1pg.png": "numbers",
+                "chapter_2_1page.png": "chapter",
+                "NYCP3ch_4pg.jpg": "existing",
+                "3_4.jpg": "duplicate",
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""Tests for page number parsing and prefix matching in process_final_data."""
+
+import unittest
+from typing import Iterable, List, Optional
+from unittest.mock import patch
+
+import numpy as np
+
+from main.utils import process_final_data
+from main.utils.process_final_data import (
+    _build_prefix_trie,
+    _match_prefix,
+    extract_page_number,
+    extract_page_numbers,
+)
+
+FILENAMES = [
+    "NYCP3ch_1pg.jpg",
+    "NYCP3ch_4pg.csv",
+    "NYCP12ch_120pg_ab12cd.jpg",
+    "NYCP3ch_1_2pg.jpg",
+    "NYCP3ch_12",
+    "NYCP3ch.jpg",
+    "NYCP3ch_.jpg",
+    "NYCP3ch_pg.jpg",
+    "NYCP3ch_xpg.jpg",
+    "NYCP3ch_ 7pg.jpg",
+    "NYCP3ch_+7pg.jpg",
+    "NYCP3ch_٣pg.jpg",
+    "NYCP3ch_" + "9" * 25 + "pg.jpg",
+    "café_5pg.jpg",
+    "",
+]
+
+
+def original_extract_page_number(filename: str) -> Optional[int]:
+    """Page number parser as it was before the partition rewrite."""
+    try:
+        parts = filename.split("_")
+        if len(parts) < 2:
+            return None
+        page_num = parts[1].split("pg")[0]
+        return int(page_num)
+    except (ValueError, IndexError):
+        return None
+
+
+def run_kernel(filenames: List[str]) -> List[int]:
+    """Call the numba kernel on filenames packed the way extract_page_numbers packs them."""
+    encoded = [name.encode("utf-8") for name in filenames]
+    offsets = np.zeros(len(encoded) + 1, np.int64)
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return process_final_data._page_numbers_kernel(buf, offsets).tolist()
+
+
+def longest_prefix(prefixes: Iterable[str], name: str) -> Optional[str]:
+    """Longest prefix that name starts with, found by checking every prefix."""
+    return max((prefix for prefix in prefixes if name.startswith(prefix)), key=len, default=None)
+
+
+class TestExtractPageNumber(unittest.TestCase):
+    """Test cases for the single-name page number parser."""
+
+    def test_matches_original(self):
+        """Test that the partition-based parser agrees with the split-based original."""
+        for filename in FILENAMES:
+            with self.subTest(filename=filename):
+                self.assertEqual(
+                    extract_page_number(filename), original_extract_page_number(filename)
+                )
+
+
+class TestExtractPageNumbers(unittest.TestCase):
+    """Test cases for the batched page number parser."""
+
+    def test_extract_page_numbers_matches_single(self):
+        """Test that the batched parser agrees with extract_page_number."""
+        expected = [extract_page_number(filename) for filename in FILENAMES]
+        self.assertEqual(extract_page_numbers(FILENAMES), expected)
+
+        # Force the numba path (when installed) even for a small batch
+        with patch.object(process_final_data, "NUMBA_MIN_FILES", 0):
+            self.assertEqual(extract_page_numbers(FILENAMES), expected)
+
+    @unittest.skipIf(process_final_data.numba is None, "numba is not installed")
+    def test_kernel_fallback_codes(self):
+        """Test that the kernel flags names it cannot parse instead of guessing."""
+        self.assertEqual(run_kernel(["NYCP3ch_4pg.jpg", "NYCP3ch_12"]), [4, 12])
+        # No '_' at all
+        self.assertEqual(run_kernel(["NYCP3ch.jpg", ""]), [-1, -1])
+        # Anything other than 1-18 ASCII digits between '_' and 'pg' is deferred
+        deferred = [
+            "NYCP3ch_pg.jpg",
+            "NYCP3ch_xpg.jpg",
+            "NYCP3ch_1_2pg.jpg",
+            "NYCP3ch_ 7pg.jpg",
+            "NYCP3ch_+7pg.jpg",
+            "NYCP3ch_٣pg.jpg",
+            "NYCP3ch_" + "9" * 25 + "pg.jpg",
+        ]
+        self.assertEqual(run_kernel(deferred), [-2] * len(deferred))
+
+
+class TestPrefixTrie(unittest.TestCase):
+    """Test cases for routing filenames to document prefixes."""
+
+    def setUp(self):
+        """Set up overlapping document prefixes."""
+        self.prefixes = ["nycp1ch", "nycp10ch", "nycp1", "nycp", "abc"]
+        self.trie = _build_prefix_trie(self.prefixes)
+
+    def test_match_prefix_matches_longest_startswith(self):
+        """Test that the trie returns the longest prefix a name starts with."""
+        names = [
+            "nycp1ch_1pg.jpg",
+            "nycp10ch_3pg.jpg",
+            "nycp100ch_3pg.jpg",
+            "nycp2ch_1pg.jpg",
+            "nycp",
+            "nyc",
+            "abcd.csv",
+            "xnycp1ch_1pg.jpg",
+            "",
+        ]
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(
+                    _match_prefix(self.trie, name), longest_prefix(self.prefixes, name)
+                )
+
+    def test_empty_prefixes(self):
+        """Test that an empty trie matches nothing and an empty prefix matches everything."""
+        self.assertIsNone(_match_prefix(_build_prefix_trie([]), "nycp1ch_1pg.jpg"))
+        trie = _build_prefix_trie(["", "nycp1ch"])
+        self.assertEqual(_match_prefix(trie, "other.jpg"), "")
+        self.assertEqual(_match_prefix(trie, "nycp1ch_1pg.jpg"), "nycp1ch")
+
+
+if __name__ == "__main__":
+    unittest.main()
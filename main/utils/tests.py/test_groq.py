@@ -1,8 +1,11 @@
 """Test module for image_groq.py."""
 
+import json
 import os
 import sys
 import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
 
 from main.utils.image_groq import GroqImageProcessor
 
@@ -77,5 +80,71 @@ class TestGroqImageProcessor(unittest.TestCase):
         self.assertIsNone(error)
 
 
+def _completion(content):
+    """Build a minimal chat completion reply holding content."""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class TestAnalyzeImagesAsync(unittest.IsolatedAsyncioTestCase):
+    """Test cases for validating batched Groq replies."""
+
+    def setUp(self) -> None:
+        """Set up a processor whose requests never leave the process."""
+        self.processor = GroqImageProcessor(api_key="test-key")
+        self.paths = ["a.jpg", "b.jpg", "c.jpg"]
+        self.batch_reply = None
+
+        # Skip image encoding; requests only record which images they cover
+        for name, build in (
+            ("_completion_request", lambda path: {"images": [path]}),
+            ("_batch_completion_request", lambda paths: {"images": list(paths)}),
+        ):
+            patcher = patch.object(self.processor, name, side_effect=build)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        async def create(images):
+            if len(images) > 1:
+                return _completion(self.batch_reply)
+            return _completion(f"single {images[0]}")
+
+        self.create = AsyncMock(side_effect=create)
+        self.processor.async_client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        )
+
+    async def test_valid_batch_reply(self) -> None:
+        """Test that a JSON array with one string per image is used as is."""
+        self.batch_reply = json.dumps(["first", "second", "third"])
+        result = await self.processor.analyze_images_async(self.paths)
+        self.assertEqual(result, ["first", "second", "third"])
+        self.assertEqual(self.create.await_count, 1)
+
+    async def test_invalid_batch_reply_falls_back(self) -> None:
+        """Test that any other reply is replaced by one request per image, in order."""
+        replies = [
+            "not json",
+            json.dumps(["only", "two"]),
+            json.dumps(["first", "second", None]),
+            json.dumps({"a.jpg": "first"}),
+            "",
+            None,
+        ]
+        expected = [f"single {path}" for path in self.paths]
+        for reply in replies:
+            with self.subTest(reply=reply):
+                self.batch_reply = reply
+                self.create.reset_mock()
+                result = await self.processor.analyze_images_async(self.paths)
+                self.assertEqual(result, expected)
+                self.assertEqual(self.create.await_count, 1 + len(self.paths))
+
+    async def test_single_image_skips_batch(self) -> None:
+        """Test that a single image is sent with the single-image prompt."""
+        result = await self.processor.analyze_images_async(["a.jpg"])
+        self.assertEqual(result, ["single a.jpg"])
+        self.processor._batch_completion_request.assert_not_called()
+
+
 if __name__ == "__main__":
     unittest.main()